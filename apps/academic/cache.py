@@ -0,0 +1,20 @@
+from config.cache import bump_generation, get_generation
+
+# Generation counters of the academic reference data
+GENRES_NAMESPACE = "genres"
+DEPARTMENTS_NAMESPACE = "departments"
+
+
+def genres_etag(genre_id=None):
+    """
+    Version tag of the genre list (or of one genre), bumped on any change.
+    """
+    return f'"genres-{get_generation(GENRES_NAMESPACE)}-{genre_id or "all"}"'
+
+
+def invalidate_genres():
+    bump_generation(GENRES_NAMESPACE)
+
+
+def invalidate_departments():
+    bump_generation(DEPARTMENTS_NAMESPACE)
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_departments, invalidate_genres
+from .models import Department, Genre
+
+
+@receiver([post_save, post_delete], sender=Genre)
+def genre_changed(sender, **kwargs):
+    invalidate_genres()
+
+
+@receiver([post_save, post_delete], sender=Department)
+def department_changed(sender, **kwargs):
+    # Department names appear in user profiles, whose ETags include this version
+    invalidate_departments()
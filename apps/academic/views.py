@@ -1,16 +1,32 @@
 from rest_framework import permissions, viewsets
 
 from apps.books.serializers import GenreSerializer
+from config.cache import conditional_get
 
+from .cache import genres_etag
 from .models import Genre
 
 
 class GenreViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for retrieving genres.
-    Provides read-only access to all genres.
+    Provides read-only access to all genres. Responses carry an ETag tied to
+    the genres generation, so unchanged lists are answered with a 304.
     """
 
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Small reference list used to fill filter dropdowns, so it is not paginated.
+    pagination_class = None
+
+    @conditional_get(etag="get_etag")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(etag="get_etag")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_etag(self, request, *args, **kwargs):
+        return genres_etag(self.kwargs.get("pk"))
@@ -0,0 +1,27 @@
+from config.cache import bump_generation, versioned_key
+
+# Cache namespace of the catalog listing pages
+BOOKS_LIST_NAMESPACE = "books:list"
+
+# Cache namespace of one book's detail, with its own generation
+BOOK_DETAIL_NAMESPACE = "books:detail:{}"
+
+
+def book_list_cache_key(params_hash):
+    return versioned_key(BOOKS_LIST_NAMESPACE, params_hash)
+
+
+def book_detail_cache_key(book_id):
+    return versioned_key(BOOK_DETAIL_NAMESPACE.format(book_id), "data")
+
+
+def invalidate_book_cache(book_id=None):
+    """
+    Moves the cached detail of a book and the catalog listing to new
+    generations. Call it whenever a book or its availability changes.
+    A background refresh that rendered the old data can then only write it
+    back under the old key, which nothing reads any more.
+    """
+    if book_id is not None:
+        bump_generation(BOOK_DETAIL_NAMESPACE.format(book_id))
+    bump_generation(BOOKS_LIST_NAMESPACE)
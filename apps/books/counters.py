@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .cache import invalidate_book_cache
+from .models import COUNTER_FIELDS, Book
+
+
+def increment_counter(book_id, field, amount=1):
+    """
+    Adds `amount` to a Book counter with a single UPDATE ... SET f = f + n,
+    so concurrent writers never lose each other's increments.
+    """
+    Book.objects.filter(pk=book_id).update(**{field: F(field) + amount})
+    # Counters are shown, and sortable, in the cached catalog pages
+    transaction.on_commit(lambda: invalidate_book_cache(book_id))
+
+
+def decrement_counter(book_id, field, amount=1):
+    """
+    Subtracts `amount` from a Book counter. Never goes below zero: a counter
+    that would is already off, and is left for reconcile_counters to repair.
+    """
+    Book.objects.filter(pk=book_id, **{f"{field}__gte": amount}).update(
+        **{field: F(field) - amount}
+    )
+    transaction.on_commit(lambda: invalidate_book_cache(book_id))
+
+
+def counted_rows():
+    """
+    The rows behind each counter, as querysets with a `book` foreign key.
+    """
+    from apps.loans.models import Loan
+    from apps.queues.models import BookQueue
+
+    from .models import Review
+
+    return {
+        "review_count": Review.objects.all(),
+        "active_queue_length": BookQueue.objects.filter(
+            status=BookQueue.QueueStatus.ACTIVE
+        ),
+        "lifetime_loans": Loan.objects.all(),
+    }
+
+
+def actual_counts():
+    """
+    Correlated COUNT(*) subqueries giving the true value of every counter.
+    """
+    return {
+        field: Coalesce(
+            Subquery(
+                rows.filter(book=OuterRef("pk"))
+                .order_by()
+                .values("book")
+                .annotate(total=Count("pk"))
+                .values("total"),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+        for field, rows in counted_rows().items()
+    }
+
+
+def reconcile_counters(queryset=None):
+    """
+    Recounts the counters of `queryset` (all books by default) and rewrites
+    the ones that drifted. Returns the ids of the books that were repaired.
+    """
+    queryset = Book.objects.all() if queryset is None else queryset
+    actual = {f"actual_{field}": count for field, count in actual_counts().items()}
+    drifted = (
+        queryset.annotate(**actual)
+        .exclude(**{field: F(f"actual_{field}") for field in COUNTER_FIELDS})
+        .values_list("pk", flat=True)
+    )
+    book_ids = list(drifted)
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).update(**actual_counts())
+    return book_ids
@@ -0,0 +1,110 @@
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from apps.site_config.uploads import stage_upload
+
+from .models import Book
+
+# Thumbnails of each distinct cover live under MEDIA_ROOT in
+# covers/<sha256[:2]>/<sha256>/, where nginx serves them as /media/covers/
+COVERS_DIR = "covers"
+
+# Bounding boxes of the thumbnails made for every cover: "small" for the
+# catalog list, "medium" for the book page
+THUMBNAIL_SIZES = {"small": (160, 240), "medium": (400, 600)}
+
+# Every size is written as WebP, with a JPEG for clients without WebP
+THUMBNAIL_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+THUMBNAIL_QUALITY = 80
+
+
+def content_hash(image_file):
+    """
+    SHA-256 hex digest of an uploaded file's content, read in chunks.
+    """
+    sha256 = hashlib.sha256()
+    image_file.seek(0)
+    for chunk in image_file.chunks():
+        sha256.update(chunk)
+    image_file.seek(0)
+    return sha256.hexdigest()
+
+
+def thumbnail_name(digest, size, extension):
+    return f"{COVERS_DIR}/{digest[:2]}/{digest}/{size}.{extension}"
+
+
+def thumbnails_exist(digest):
+    # Written last by make_thumbnails, so its presence means all of them are
+    last_size, last_extension = list(THUMBNAIL_SIZES)[-1], list(THUMBNAIL_FORMATS)[-1]
+    return default_storage.exists(thumbnail_name(digest, last_size, last_extension))
+
+
+def thumbnail_urls(book, size):
+    """
+    {"webp": url, "jpg": url} of a book's thumbnail in `size`, or None while
+    the book has no processed cover. cover_hash is only ever saved along with
+    the cover_image it was computed from, once its thumbnails are written.
+    """
+    if not (book.cover_hash and book.cover_image):
+        return None
+    return {
+        extension: default_storage.url(thumbnail_name(book.cover_hash, size, extension))
+        for extension in THUMBNAIL_FORMATS
+    }
+
+
+def make_thumbnails(digest, image_file):
+    """
+    Writes every THUMBNAIL_SIZES x THUMBNAIL_FORMATS thumbnail of an image,
+    unless the thumbnails of that content already exist. Returns whether any
+    were written.
+    """
+    if thumbnails_exist(digest):
+        return False
+    with Image.open(image_file) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for size, box in THUMBNAIL_SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail(box, Image.Resampling.LANCZOS)
+            for extension, image_format in THUMBNAIL_FORMATS.items():
+                buffer = BytesIO()
+                thumbnail.save(buffer, image_format, quality=THUMBNAIL_QUALITY)
+                name = thumbnail_name(digest, size, extension)
+                default_storage.delete(name)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+    return True
+
+
+def stage_cover(book, image_file):
+    """
+    Sets a new cover on the book. A cover already uploaded for another book
+    (a duplicate edition) is reused as is; anything else is staged for
+    thumbnailing and upload (see stage_upload). Either way cover_image and
+    cover_hash change together, and only once the thumbnails exist, so the
+    book keeps showing its previous cover until the new one is ready.
+    """
+    from .tasks import generate_cover_thumbnails
+
+    digest = content_hash(image_file)
+    twin_url = (
+        Book.objects.filter(cover_hash=digest, cover_image__gt="")
+        .exclude(pk=book.pk)
+        .values_list("cover_image", flat=True)
+        .first()
+    )
+    if twin_url and thumbnails_exist(digest):
+        book.cover_image, book.cover_hash = twin_url, digest
+        book.save(update_fields=["cover_image", "cover_hash"])
+        return None
+    return stage_upload(
+        book,
+        "cover_image",
+        image_file,
+        prepare=[generate_cover_thumbnails],
+        extra_fields={"cover_hash": digest},
+    )
@@ -1,8 +1,11 @@
 import django_filters
+from rest_framework import filters
 
 from apps.academic.models import Genre
 
+from .fuzzy import fuzzy_search
 from .models import Book
+from .search import is_postgres, search_books
 
 
 class BookFilter(django_filters.FilterSet):
@@ -26,3 +29,33 @@ class BookFilter(django_filters.FilterSet):
             "publisher": ["exact"],
             # The 'genres' field is handled by the custom definition above.
         }
+
+
+class BookSearchFilter(filters.SearchFilter):
+    """
+    `?search=` backend for the catalog.
+    On PostgreSQL it matches against the GIN-indexed Book.search_vector and
+    annotates a `search_rank` so results come back best match first. On other
+    databases it falls back to DRF's ILIKE search over `search_fields`.
+
+    With `?fuzzy=1` the terms are instead matched by trigram similarity
+    against titles and authors, which tolerates typos.
+    """
+
+    fuzzy_param = "fuzzy"
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if search_terms and self.is_fuzzy(request):
+            return fuzzy_search(queryset, " ".join(search_terms))
+
+        if not is_postgres(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        if not search_terms:
+            return queryset
+        return search_books(queryset, " ".join(search_terms))
+
+    def is_fuzzy(self, request):
+        value = request.query_params.get(self.fuzzy_param, "")
+        return value.lower() in ("1", "true", "yes")
@@ -0,0 +1,116 @@
+import re
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import Case, Count, FloatField, Value, When
+from django.db.models.functions import Cast, Greatest
+
+from .models import BookTrigram
+
+# Minimum word similarity (0-1) for a title or author to count as a match
+FUZZY_SIMILARITY_THRESHOLD = 0.5
+
+# Upper bound on the candidates ranked by the trigram table fallback
+FUZZY_MAX_RESULTS = 100
+
+# Fields indexed for fuzzy matching, on both backends
+FUZZY_FIELDS = ("title", "author")
+
+_pg_trgm_installed = {}
+
+
+def pg_trgm_available(using="default"):
+    """
+    Whether the pg_trgm extension is installed on this database.
+    The answer is cached per process; the extension only changes on migrate.
+    """
+    if using not in _pg_trgm_installed:
+        connection = connections[using]
+        installed = False
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                installed = cursor.fetchone() is not None
+        _pg_trgm_installed[using] = installed
+    return _pg_trgm_installed[using]
+
+
+def trigrams(text):
+    """
+    Splits text into the same trigram set pg_trgm would: lowercased
+    alphanumeric words, each padded with two leading and one trailing space.
+    """
+    grams = set()
+    for word in re.findall(r"[^\W_]+", (text or "").lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def rebuild_book_trigrams(book):
+    """
+    Replaces the precomputed trigram rows of one book.
+    """
+    BookTrigram.objects.filter(book=book).delete()
+    BookTrigram.objects.bulk_create(
+        [
+            BookTrigram(book=book, field=field, trigram=gram)
+            for field in FUZZY_FIELDS
+            for gram in trigrams(getattr(book, field))
+        ]
+    )
+
+
+def fuzzy_search(queryset, term):
+    """
+    Typo-tolerant title/author search. Matching rows are annotated with a
+    `search_rank` holding their best title/author word similarity (a real in
+    pg_trgm, cast to double precision like the full-text rank).
+    """
+    if pg_trgm_available(queryset.db):
+        # Compared against our own threshold rather than with %>, which cuts
+        # at the pg_trgm.word_similarity_threshold setting (0.6 by default)
+        return queryset.annotate(
+            search_rank=Cast(
+                Greatest(
+                    TrigramWordSimilarity(term, "title"),
+                    TrigramWordSimilarity(term, "author"),
+                ),
+                FloatField(),
+            )
+        ).filter(search_rank__gte=FUZZY_SIMILARITY_THRESHOLD)
+    return _fuzzy_search_trigram_table(queryset, term)
+
+
+def _fuzzy_search_trigram_table(queryset, term):
+    """
+    Fallback for databases without pg_trgm. Word similarity is approximated
+    by the share of the query's trigrams found in the title or author.
+    """
+    query_grams = trigrams(term)
+    if not query_grams:
+        return queryset.none()
+
+    hits = (
+        BookTrigram.objects.filter(
+            trigram__in=query_grams, book__in=queryset.values("pk")
+        )
+        .values("book_id", "field")
+        .annotate(hits=Count("id"))
+    )
+    scores = {}
+    for row in hits:
+        similarity = row["hits"] / len(query_grams)
+        if similarity >= FUZZY_SIMILARITY_THRESHOLD:
+            scores[row["book_id"]] = max(similarity, scores.get(row["book_id"], 0))
+
+    best = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best = best[:FUZZY_MAX_RESULTS]
+    if not best:
+        return queryset.none()
+    return queryset.filter(pk__in=[book_id for book_id, _ in best]).annotate(
+        search_rank=Case(
+            *[When(pk=book_id, then=Value(score)) for book_id, score in best],
+            output_field=FloatField(),
+        )
+    )
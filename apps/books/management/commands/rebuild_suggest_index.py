@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.books.models import Book
+from apps.books.suggest import SUGGEST_REBUILD_BATCH_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the Redis autocomplete index used by /api/books/suggest/.
+    Run it after restoring a database or flushing Redis.
+    """
+
+    help = "Rebuilds the book title/author suggest index in Redis."
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        books = Book.objects.values_list("id", "title", "author").iterator(
+            chunk_size=SUGGEST_REBUILD_BATCH_SIZE
+        )
+        count = rebuild_index(books)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {count} books in {time.monotonic() - started:.2f}s."
+            )
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.books.cache import invalidate_book_cache
+from apps.books.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    """
+    Recounts the denormalized Book counters (review_count,
+    active_queue_length, lifetime_loans) and repairs any that drifted,
+    e.g. after bulk edits made outside the ORM write paths.
+    """
+
+    help = "Repairs drifted review/queue/loan counters on books."
+
+    def handle(self, *args, **options):
+        repaired = reconcile_counters()
+        if repaired:
+            invalidate_book_cache()
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired the counters of {len(repaired)} books.")
+        )
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # GIN indexes and tsvector are PostgreSQL features; other databases
+    # keep the column empty and search through the ILIKE fallback.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Book = apps.get_model("books", "Book")
+    Book.objects.update(
+        search_vector=(
+            SearchVector("title", weight="A", config="english")
+            + SearchVector("isbn", weight="A", config="english")
+            + SearchVector("author", weight="B", config="english")
+            + SearchVector("publisher", weight="C", config="english")
+            + SearchVector("description", weight="D", config="english")
+        )
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS book_search_vector_idx "
+        "ON books_book USING gin (search_vector)"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS book_search_vector_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_title_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
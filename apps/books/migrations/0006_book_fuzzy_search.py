@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:54
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def pg_trgm_is_available(connection):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def setup_fuzzy_search(apps, schema_editor):
+    """
+    Installs pg_trgm with GIN trigram indexes on title and author when the
+    server ships the extension; otherwise fills the fallback trigram table.
+    """
+    if pg_trgm_is_available(schema_editor.connection):
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for field in ("title", "author"):
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS book_{field}_trgm_idx "
+                f"ON books_book USING gin ({field} gin_trgm_ops)"
+            )
+        return
+
+    Book = apps.get_model("books", "Book")
+    BookTrigram = apps.get_model("books", "BookTrigram")
+    rows = []
+    for book in Book.objects.only("id", "title", "author").iterator():
+        for field in ("title", "author"):
+            grams = set()
+            for word in re.findall(r"[^\W_]+", getattr(book, field).lower()):
+                padded = f"  {word} "
+                grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+            rows.extend(
+                BookTrigram(book_id=book.id, field=field, trigram=gram)
+                for gram in grams
+            )
+    BookTrigram.objects.bulk_create(rows, batch_size=1000)
+
+
+def teardown_fuzzy_search(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for field in ("title", "author"):
+        schema_editor.execute(f"DROP INDEX IF EXISTS book_{field}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_book_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('title', 'Title'), ('author', 'Author')], max_length=10)),
+                ('trigram', models.CharField(db_index=True, max_length=3)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='books.book')),
+            ],
+            options={
+                'unique_together': {('book', 'field', 'trigram')},
+            },
+        ),
+        migrations.RunPython(setup_fuzzy_search, teardown_fuzzy_search),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:04
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Book = apps.get_model("books", "Book")
+    related = {
+        "review_count": apps.get_model("books", "Review").objects.all(),
+        "active_queue_length": apps.get_model("queues", "BookQueue").objects.filter(
+            status="ACTIVE"
+        ),
+        "lifetime_loans": apps.get_model("loans", "Loan").objects.all(),
+    }
+    Book.objects.update(
+        **{
+            field: Coalesce(
+                Subquery(
+                    rows.filter(book=OuterRef("pk"))
+                    .order_by()
+                    .values("book")
+                    .annotate(total=Count("pk"))
+                    .values("total"),
+                    output_field=IntegerField(),
+                ),
+                Value(0),
+            )
+            for field, rows in related.items()
+        }
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0001_initial'),
+        ('books', '0006_book_fuzzy_search'),
+        ('loans', '0002_initial'),
+        ('queues', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='active_queue_length',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='lifetime_loans',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['review_count', 'id'], name='book_review_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['active_queue_length', 'id'], name='book_queue_length_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['lifetime_loans', 'id'], name='book_lifetime_loans_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
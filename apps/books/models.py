@@ -1,8 +1,12 @@
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from apps.academic.models import Genre
 
+# Denormalized Book counters, only ever written with F() updates
+COUNTER_FIELDS = ("review_count", "active_queue_length", "lifetime_loans")
+
 
 class Book(models.Model):
     title = models.CharField(max_length=255)
@@ -12,14 +16,52 @@ class Book(models.Model):
     total_copies = models.PositiveIntegerField(default=1)
     available_copies = models.PositiveIntegerField(default=1)
     cover_image = models.URLField(null=True, blank=True)
+    # SHA-256 of the uploaded cover: names its thumbnails under MEDIA_ROOT and
+    # lets duplicate editions share one upload (see apps.books.covers)
+    cover_hash = models.CharField(
+        max_length=64, blank=True, db_index=True, editable=False
+    )
     description = models.TextField(blank=True)
     publisher = models.CharField(max_length=255, blank=True)
     page_count = models.PositiveIntegerField(null=True, blank=True)
     genres = models.ManyToManyField(Genre, blank=True, related_name="books")
+    # Weighted full-text document, kept up to date by apps.books.signals.
+    # Its GIN index is created by migration 0005 on PostgreSQL only.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Denormalized aggregates, maintained with F() updates by apps.books.counters
+    # and repaired by the reconcile_book_counters command.
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    active_queue_length = models.PositiveIntegerField(default=0, editable=False)
+    lifetime_loans = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination key for the catalog listing
+            models.Index(fields=["title", "id"], name="book_title_id_idx"),
+            # Keyset pagination keys for ?ordering=<counter>
+            models.Index(fields=["review_count", "id"], name="book_review_count_idx"),
+            models.Index(
+                fields=["active_queue_length", "id"], name="book_queue_length_idx"
+            ),
+            models.Index(
+                fields=["lifetime_loans", "id"], name="book_lifetime_loans_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author}"
 
+    def save(self, *args, **kwargs):
+        # A full save of an instance loaded before a concurrent increment
+        # would write its stale counters back; leave them out of the UPDATE.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Review(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="reviews")
@@ -35,3 +77,21 @@ class Review(models.Model):
 
     def __str__(self):
         return f"Review by {self.user.email} for {self.book.title}"
+
+
+class BookTrigram(models.Model):
+    """
+    Precomputed title/author trigrams used for fuzzy search on databases
+    without pg_trgm (e.g. SQLite in tests). Maintained by apps.books.signals.
+    """
+
+    class Field(models.TextChoices):
+        TITLE = "title", "Title"
+        AUTHOR = "author", "Author"
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="trigrams")
+    field = models.CharField(max_length=10, choices=Field.choices)
+    trigram = models.CharField(max_length=3, db_index=True)
+
+    class Meta:
+        unique_together = ("book", "field", "trigram")
@@ -0,0 +1,41 @@
+from django.db.models import Prefetch
+from rest_framework.generics import get_object_or_404
+
+from .models import Book, Review
+from .serializers import BookSerializer
+
+
+def book_list_payload(request):
+    """
+    One page of the slim catalog listing for a GET `request` (a Django
+    HttpRequest): its search, filters, ordering and cursor applied the way
+    BookViewSet lists books. The data depends on the URL alone, never on
+    the user, which is what lets it be cached and rebuilt in the background.
+    """
+    from .views import BookViewSet
+
+    view = BookViewSet(
+        action="list", action_map={"get": "list"}, args=(), kwargs={}, format_kwarg=None
+    )
+    view.request = view.initialize_request(request)
+    queryset = view.filter_queryset(view.get_queryset())
+    page = view.paginate_queryset(queryset)
+    serializer = view.get_serializer(page, many=True)
+    return view.get_paginated_response(serializer.data).data
+
+
+def book_detail_payload(request, pk):
+    """
+    Full details of book `pk` with its nested reviews (and their authors);
+    raises Http404 if there is no such book.
+    """
+    queryset = Book.objects.prefetch_related(
+        "genres",
+        Prefetch(
+            "reviews",
+            queryset=Review.objects.select_related(
+                "user__department", "user__library_card"
+            ),
+        ),
+    )
+    return BookSerializer(get_object_or_404(queryset, pk=pk)).data
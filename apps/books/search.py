@@ -0,0 +1,57 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from .models import Book
+
+# Text search configuration used for both the stored vector and the queries
+SEARCH_CONFIG = "english"
+
+# Fields that feed Book.search_vector; saves touching none of them skip the refresh
+SEARCH_VECTOR_FIELDS = {"title", "author", "isbn", "publisher", "description"}
+
+
+def is_postgres(using="default"):
+    return connections[using].vendor == "postgresql"
+
+
+def book_search_vector():
+    """
+    The weighted document stored in Book.search_vector.
+    Title and author (and the ISBN, which is only ever matched exactly)
+    outrank the publisher, which in turn outranks the description.
+    """
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("isbn", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("author", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("publisher", weight="C", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="D", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(book_ids=None):
+    """
+    Recomputes the stored search vector in the database, for the given books
+    or for the whole catalog. A no-op outside PostgreSQL.
+    """
+    if not is_postgres():
+        return 0
+    queryset = Book.objects.all()
+    if book_ids is not None:
+        queryset = queryset.filter(pk__in=book_ids)
+    return queryset.update(search_vector=book_search_vector())
+
+
+def search_books(queryset, terms):
+    """
+    Filters a Book queryset with the GIN-indexed full-text search and
+    annotates each row with its `search_rank`. ts_rank returns a real; the
+    rank is cast to double precision so that it survives the round trip
+    through a pagination cursor exactly.
+    """
+    query = SearchQuery(terms, search_type="websearch", config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+    )
@@ -1,11 +1,16 @@
+from django.utils.text import Truncator
 from rest_framework import serializers
 
 from apps.academic.models import Genre
-from apps.site_config.utils import upload_image_to_imgbb
+from apps.site_config.uploads import upload_pending
 from apps.users.serializers import UserSerializer
 
+from .covers import THUMBNAIL_SIZES, stage_cover, thumbnail_urls
 from .models import Book, Review
 
+# Maximum number of characters of a review shown in catalog listings
+REVIEW_SNIPPET_LENGTH = 200
+
 
 class GenreSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,6 +28,65 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ["user"]  # User is set automatically from the request
 
 
+class ReviewSnippetSerializer(serializers.ModelSerializer):
+    """
+    Compact review used inside catalog listings: no nested user profile,
+    and the text is cut down to a short preview.
+    """
+
+    user_name = serializers.CharField(source="user.first_name", read_only=True)
+    text = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Review
+        fields = ["id", "user_name", "text", "created_at"]
+
+    def get_text(self, obj):
+        return Truncator(obj.text).chars(REVIEW_SNIPPET_LENGTH)
+
+
+class BookListSerializer(serializers.ModelSerializer):
+    """
+    Slim representation for the catalog listing.
+    Genres are reduced to their slugs and reviews to a count; the latest
+    review snippets are only included when the view asks for them through
+    the `review_snippets` context value.
+    """
+
+    genres = serializers.SlugRelatedField(many=True, read_only=True, slug_field="slug")
+    cover_thumbnail = serializers.SerializerMethodField()
+    latest_reviews = ReviewSnippetSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Book
+        fields = [
+            "id",
+            "title",
+            "author",
+            "isbn",
+            "published_date",
+            "publisher",
+            "total_copies",
+            "available_copies",
+            "cover_image",
+            "cover_thumbnail",
+            "genres",
+            "review_count",
+            "active_queue_length",
+            "lifetime_loans",
+            "latest_reviews",
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get("review_snippets"):
+            fields.pop("latest_reviews")
+        return fields
+
+    def get_cover_thumbnail(self, obj):
+        return thumbnail_urls(obj, "small")
+
+
 class BookSerializer(serializers.ModelSerializer):
     genres = GenreSerializer(many=True, read_only=True)
     genre_ids = serializers.PrimaryKeyRelatedField(
@@ -34,6 +98,8 @@ class BookSerializer(serializers.ModelSerializer):
     )
     upload_cover_image = serializers.ImageField(write_only=True, required=False)
     cover_image = serializers.URLField(read_only=True)
+    cover_image_pending = serializers.SerializerMethodField()
+    cover_thumbnails = serializers.SerializerMethodField()
     reviews = ReviewSerializer(many=True, read_only=True)
 
     class Meta:
@@ -53,48 +119,31 @@ class BookSerializer(serializers.ModelSerializer):
             "genre_ids",
             "upload_cover_image",
             "cover_image",
+            "cover_image_pending",
+            "cover_thumbnails",
             "reviews",
         ]
 
-    def update(self, instance, validated_data):
-        # --- START DEBUGGING ---
-        print("--- Inside BookSerializer UPDATE method ---")
-        print(f"Initial validated_data: {validated_data}")
+    def get_cover_image_pending(self, obj):
+        return upload_pending(obj, "cover_image")
 
-        image_file = validated_data.pop("upload_cover_image", None)
-        print(f"Popped image_file: {image_file}")
-        # --- END DEBUGGING ---
+    def get_cover_thumbnails(self, obj):
+        if not thumbnail_urls(obj, "small"):
+            return None
+        return {size: thumbnail_urls(obj, size) for size in THUMBNAIL_SIZES}
 
-        # Perform the standard update for all other fields
+    def update(self, instance, validated_data):
+        image_file = validated_data.pop("upload_cover_image", None)
         instance = super().update(instance, validated_data)
-
         if image_file:
-            print(">>> Image file exists, attempting to upload to ImgBB...")
-            image_url = upload_image_to_imgbb(image_file)
-
-            # --- START DEBUGGING ---
-            print(f"URL received from ImgBB: {image_url}")
-            # --- END DEBUGGING ---
-
-            if image_url:
-                print(f">>> ImgBB URL is valid. Saving '{image_url}' to instance...")
-                instance.cover_image = image_url
-                instance.save(update_fields=["cover_image"])
-            else:
-                print(">>> ImgBB URL is None. Skipping save.")
-
-        print(
-            f"--- Final instance cover_image before returning: {instance.cover_image} ---"
-        )
+            # Thumbnailed and pushed to ImgBB by Celery tasks; cover_image
+            # is set when done (or right away for an already uploaded cover)
+            stage_cover(instance, image_file)
         return instance
 
-    # Add the same logic to the create method for completeness
     def create(self, validated_data):
         image_file = validated_data.pop("upload_cover_image", None)
         instance = super().create(validated_data)
         if image_file:
-            image_url = upload_image_to_imgbb(image_file)
-            if image_url:
-                instance.cover_image = image_url
-                instance.save(update_fields=["cover_image"])
+            stage_cover(instance, image_file)
         return instance
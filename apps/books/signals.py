@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_book_cache
+from .counters import decrement_counter, increment_counter
+from .fuzzy import FUZZY_FIELDS, pg_trgm_available, rebuild_book_trigrams
+from .models import Book, Review
+from .search import SEARCH_VECTOR_FIELDS, update_search_vector
+from .suggest import index_book, remove_book
+
+# Book counter kept in step with the creation and deletion of each model's rows
+COUNTED_BY = {"books.Review": "review_count", "loans.Loan": "lifetime_loans"}
+
+
+@receiver(post_save, sender=Book)
+def refresh_search_vector(sender, instance, update_fields=None, **kwargs):
+    """
+    Keeps Book.search_vector in sync with the text columns it is built from.
+    """
+    if update_fields is not None and not SEARCH_VECTOR_FIELDS.intersection(
+        update_fields
+    ):
+        return
+    update_search_vector([instance.pk])
+
+
+@receiver(post_save, sender=Book)
+def refresh_fuzzy_trigrams(sender, instance, update_fields=None, **kwargs):
+    """
+    Maintains the fallback trigram table when pg_trgm is not available.
+    """
+    if update_fields is not None and not set(FUZZY_FIELDS).intersection(
+        update_fields
+    ):
+        return
+    if not pg_trgm_available():
+        rebuild_book_trigrams(instance)
+
+
+@receiver(post_save, sender=Book)
+def refresh_suggest_index(sender, instance, update_fields=None, **kwargs):
+    """
+    Keeps the Redis autocomplete index in sync with titles and authors,
+    once the change commits (a rolled back one never reaches the index).
+    """
+    if update_fields is not None and not {"title", "author"}.intersection(
+        update_fields
+    ):
+        return
+    transaction.on_commit(lambda: index_book(instance))
+
+
+@receiver(post_save, sender=Book)
+def refresh_cached_cover(sender, instance, update_fields=None, **kwargs):
+    """
+    Covers are written by upload_image_task after the request that uploaded
+    them has returned, so the cached book pages are dropped when they land.
+    """
+    if update_fields is not None and "cover_image" in update_fields:
+        invalidate_book_cache(instance.pk)
+
+
+@receiver(post_delete, sender=Book)
+def drop_from_suggest_index(sender, instance, **kwargs):
+    book_id = instance.pk  # Cleared on the instance once the delete is done
+    transaction.on_commit(lambda: remove_book(book_id))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender="loans.Loan")
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        increment_counter(instance.book_id, COUNTED_BY[sender._meta.label])
+
+
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender="loans.Loan")
+def count_deleted(sender, instance, **kwargs):
+    decrement_counter(instance.book_id, COUNTED_BY[sender._meta.label])
+
+
+@receiver(post_save, sender="queues.BookQueue")
+def count_joined_queue(sender, instance, created, **kwargs):
+    """
+    Entries leaving the ACTIVE status are uncounted where that happens (see
+    apps.queues), since a status change cannot be told apart here.
+    """
+    if created and instance.status == sender.QueueStatus.ACTIVE:
+        increment_counter(instance.book_id, "active_queue_length")
+
+
+@receiver(post_delete, sender="queues.BookQueue")
+def count_left_queue(sender, instance, **kwargs):
+    if instance.status == sender.QueueStatus.ACTIVE:
+        decrement_counter(instance.book_id, "active_queue_length")
@@ -0,0 +1,151 @@
+import json
+import re
+
+from django_redis import get_redis_connection
+
+# Sorted set holding every indexable phrase as "<phrase>\x00<book id>"; all
+# scores are 0 so ZRANGEBYLEX can walk it in lexicographic order
+SUGGEST_INDEX_KEY = "books:suggest:index"
+
+# Hash of book id -> {"id", "title", "author"}, the payload of a suggestion
+SUGGEST_DOCS_KEY = "books:suggest:docs"
+
+# Maximum number of suggestions returned per query
+SUGGEST_LIMIT = 10
+
+# Index entries scanned per query; several entries can point to the same book
+SUGGEST_SCAN_LIMIT = SUGGEST_LIMIT * 5
+
+# Books indexed per Redis round trip when rebuilding
+SUGGEST_REBUILD_BATCH_SIZE = 1000
+
+SEPARATOR = "\x00"
+
+
+def normalize(text):
+    """
+    Lowercases text and reduces it to single-spaced alphanumeric words.
+    """
+    return " ".join(re.findall(r"[^\W_]+", (text or "").casefold()))
+
+
+def phrases(title, author):
+    """
+    Every suffix of the title and of the author, so "hand" matches
+    "The Left Hand of Darkness" as well as "the".
+    """
+    result = set()
+    for text in (title, author):
+        words = normalize(text).split()
+        result.update(" ".join(words[i:]) for i in range(len(words)))
+    return result
+
+
+def _members(book_id, title, author):
+    return [f"{phrase}{SEPARATOR}{book_id}" for phrase in phrases(title, author)]
+
+
+def _add(pipe, index_key, docs_key, book_id, title, author):
+    members = _members(book_id, title, author)
+    if members:
+        pipe.zadd(index_key, dict.fromkeys(members, 0))
+    pipe.hset(
+        docs_key,
+        book_id,
+        json.dumps({"id": book_id, "title": title, "author": author}),
+    )
+
+
+def _old_members(redis, book_id):
+    doc = redis.hget(SUGGEST_DOCS_KEY, book_id)
+    if doc is None:
+        return []
+    doc = json.loads(doc)
+    return _members(book_id, doc["title"], doc["author"])
+
+
+def index_book(book):
+    """
+    Adds a book to the suggest index, replacing the phrases of its previous
+    title and author.
+    """
+    redis = get_redis_connection("default")
+    stale = _old_members(redis, book.pk)
+    with redis.pipeline() as pipe:
+        if stale:
+            pipe.zrem(SUGGEST_INDEX_KEY, *stale)
+        _add(
+            pipe, SUGGEST_INDEX_KEY, SUGGEST_DOCS_KEY, book.pk, book.title, book.author
+        )
+        pipe.execute()
+
+
+def remove_book(book_id):
+    redis = get_redis_connection("default")
+    stale = _old_members(redis, book_id)
+    with redis.pipeline() as pipe:
+        if stale:
+            pipe.zrem(SUGGEST_INDEX_KEY, *stale)
+        pipe.hdel(SUGGEST_DOCS_KEY, book_id)
+        pipe.execute()
+
+
+def rebuild_index(books):
+    """
+    Rebuilds the index from `books` (an iterable of (id, title, author)) into
+    temporary keys, then swaps them in with RENAME so readers never see a
+    partial index. Returns the number of books indexed.
+    """
+    redis = get_redis_connection("default")
+    index_tmp = f"{SUGGEST_INDEX_KEY}:rebuild"
+    docs_tmp = f"{SUGGEST_DOCS_KEY}:rebuild"
+    redis.delete(index_tmp, docs_tmp)
+
+    count = 0
+    pipe = redis.pipeline(transaction=False)
+    for book_id, title, author in books:
+        _add(pipe, index_tmp, docs_tmp, book_id, title, author)
+        count += 1
+        if count % SUGGEST_REBUILD_BATCH_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+
+    with redis.pipeline() as pipe:
+        if count:
+            pipe.rename(index_tmp, SUGGEST_INDEX_KEY)
+            pipe.rename(docs_tmp, SUGGEST_DOCS_KEY)
+        else:
+            pipe.delete(SUGGEST_INDEX_KEY, SUGGEST_DOCS_KEY)
+        pipe.execute()
+    return count
+
+
+def suggest(query, limit=SUGGEST_LIMIT):
+    """
+    Returns up to `limit` {id, title, author} dicts for books whose title or
+    author contains a word starting with `query`. Served from Redis alone.
+    """
+    prefix = normalize(query)
+    if not prefix:
+        return []
+
+    redis = get_redis_connection("default")
+    members = redis.zrangebylex(
+        SUGGEST_INDEX_KEY,
+        f"[{prefix}".encode(),
+        # 0xFF never occurs in UTF-8, so this bounds every continuation
+        f"[{prefix}".encode() + b"\xff",
+        start=0,
+        num=SUGGEST_SCAN_LIMIT,
+    )
+    book_ids = []
+    for member in members:
+        book_id = member.decode().rpartition(SEPARATOR)[2]
+        if book_id not in book_ids:
+            book_ids.append(book_id)
+            if len(book_ids) == limit:
+                break
+    if not book_ids:
+        return []
+    docs = redis.hmget(SUGGEST_DOCS_KEY, book_ids)
+    return [json.loads(doc) for doc in docs if doc is not None]
@@ -0,0 +1,25 @@
+from celery import shared_task
+from django.core.files.storage import default_storage
+
+from .covers import content_hash, make_thumbnails
+
+
+@shared_task
+def generate_cover_thumbnails(staged_name):
+    """
+    Writes the list/detail thumbnails of a staged cover under MEDIA_ROOT,
+    before upload_image_task pushes the original to ImgBB and saves its hash.
+    A cover that cannot be thumbnailed is not published at all: the error
+    stops the chain, so the book keeps its previous cover and hash.
+    """
+    try:
+        with default_storage.open(staged_name, "rb") as staged:
+            digest = content_hash(staged)
+            written = make_thumbnails(digest, staged)
+    except Exception as e:
+        default_storage.delete(staged_name)
+        print(f"CRITICAL ERROR: Could not make thumbnails of {staged_name}: {e}")
+        raise
+    if not written:
+        return f"Thumbnails of {digest} already exist."
+    return f"Wrote thumbnails of {digest}."
@@ -1,3 +1,860 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from apps.academic.models import Genre
+from apps.loans.models import Loan
+from apps.queues.models import BookQueue
+from apps.site_config.uploads import UPLOAD_STAGING_DIR
+from apps.users.models import User
+from config.cache import single_flight
+from config.pagination import KeysetCursorPagination
+from config.tasks import refresh_cached_response
+
+from .cache import (
+    book_detail_cache_key,
+    book_list_cache_key,
+    invalidate_book_cache,
+)
+from .counters import reconcile_counters
+from .covers import THUMBNAIL_SIZES, thumbnail_name
+from .fuzzy import FUZZY_SIMILARITY_THRESHOLD, pg_trgm_available, trigrams
+from .models import Book, BookTrigram, Review
+from .payloads import book_detail_payload
+from .suggest import SUGGEST_LIMIT, suggest
+
+
+class CursorWalkMixin:
+    def walk(self, params):
+        """Follows the next links from the first page; returns the pages' ids."""
+        pages = []
+        response = self.client.get("/api/books/", params)
+        while len(pages) < Book.objects.count():
+            self.assertEqual(response.status_code, 200)
+            pages.append([book["id"] for book in response.data["results"]])
+            if response.data["next"] is None:
+                return pages, response
+            response = self.client.get(response.data["next"])
+        self.fail("The cursor stopped advancing.")
+
+
+class BookListPaginationTests(CursorWalkMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@test.com", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for index, title in enumerate(["Dune", "Emma", "Beloved"]):
+            Book.objects.create(
+                title=title,
+                author="Author",
+                isbn=f"97800000000{index}",
+                published_date=timezone.now().date(),
+            )
+
+    def test_list_is_cursor_paginated_by_title(self):
+        """Pages follow the title ordering and link to the next cursor."""
+        response = self.client.get("/api/books/", {"page_size": 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [book["title"] for book in response.data["results"]], ["Beloved", "Dune"]
+        )
+        self.assertIsNotNone(response.data["next"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([book["title"] for book in response.data["results"]], ["Emma"])
+        self.assertIsNone(response.data["next"])
+
+    def test_page_size_is_capped(self):
+        """Oversized page_size values are clamped to the paginator's limit."""
+        with mock.patch.object(KeysetCursorPagination, "max_page_size", 2):
+            response = self.client.get("/api/books/", {"page_size": 100000})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_ties_on_the_ordering_key_are_paged_by_id(self):
+        """Rows sharing a counter value are neither repeated nor skipped."""
+        for index in range(9):
+            Book.objects.create(
+                title=f"Tied {index}",
+                author="Author",
+                isbn=f"97811111111{index}",
+                published_date=timezone.now().date(),
+            )
+        Book.objects.filter(title="Emma").update(review_count=1)
+        expected = list(
+            Book.objects.order_by("-review_count", "-id").values_list("id", flat=True)
+        )
+
+        # Far fewer tied rows than this would defeat an OFFSET-based cursor
+        with mock.patch.object(KeysetCursorPagination, "offset_cutoff", 2):
+            pages, last = self.walk({"ordering": "-review_count", "page_size": 3})
+            self.assertEqual([book_id for page in pages for book_id in page], expected)
+            self.assertEqual(len(pages), 4)
+
+            response = self.client.get(last.data["previous"])
+            self.assertEqual(
+                [book["id"] for book in response.data["results"]], pages[-2]
+            )
+
+    def test_duplicate_titles_are_paged_by_id(self):
+        """Editions sharing a title each show up once, in (title, id) order."""
+        for index in range(6):
+            Book.objects.create(
+                title="Emma",
+                author="Jane Austen",
+                isbn=f"97822222222{index}",
+                published_date=timezone.now().date(),
+            )
+        expected = list(
+            Book.objects.order_by("title", "id").values_list("id", flat=True)
+        )
+
+        with mock.patch.object(KeysetCursorPagination, "offset_cutoff", 2):
+            pages, _ = self.walk({"page_size": 2})
+
+        self.assertEqual([book_id for page in pages for book_id in page], expected)
+
+
+class BookListRepresentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="reader@test.com", password="p", first_name="Ada"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.genre = Genre.objects.create(name="Science Fiction")
+        self.book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            isbn="9780441013593",
+            published_date=timezone.now().date(),
+        )
+        self.book.genres.add(self.genre)
+        Review.objects.create(book=self.book, user=self.user, text="First read.")
+        Review.objects.create(book=self.book, user=self.user, text="Second read.")
+
+    def test_list_uses_slim_representation(self):
+        """The list ships genre slugs and a review count, not nested reviews."""
+        response = self.client.get("/api/books/")
+
+        book = response.data["results"][0]
+        self.assertNotIn("reviews", book)
+        self.assertNotIn("latest_reviews", book)
+        self.assertEqual(book["genres"], ["science-fiction"])
+        self.assertEqual(book["review_count"], 2)
+
+    def test_list_can_embed_latest_review_snippets(self):
+        response = self.client.get("/api/books/", {"review_snippets": 1})
+
+        snippets = response.data["results"][0]["latest_reviews"]
+        self.assertEqual(len(snippets), 1)
+        self.assertEqual(snippets[0]["text"], "Second read.")
+        self.assertEqual(snippets[0]["user_name"], "Ada")
+
+    def test_retrieve_keeps_nested_reviews(self):
+        response = self.client.get(f"/api/books/{self.book.pk}/")
+
+        self.assertEqual(len(response.data["reviews"]), 2)
+        self.assertEqual(response.data["reviews"][0]["user"]["email"], self.user.email)
+
+
+class BookSearchTests(CursorWalkMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@test.com", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.title_match = Book.objects.create(
+            title="Django for Professionals",
+            author="William Vincent",
+            isbn="9781735467221",
+            published_date=timezone.now().date(),
+        )
+        self.description_match = Book.objects.create(
+            title="Web Development Handbook",
+            author="Jane Doe",
+            isbn="9781735467238",
+            published_date=timezone.now().date(),
+            description="Covers Flask and Django briefly.",
+        )
+        Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            isbn="9780441013593",
+            published_date=timezone.now().date(),
+        )
+
+    def test_search_matches_title(self):
+        response = self.client.get("/api/books/", {"search": "django"})
+
+        ids = [book["id"] for book in response.data["results"]]
+        self.assertIn(self.title_match.pk, ids)
+
+    @skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL")
+    def test_search_is_ranked_on_postgres(self):
+        """Title matches outrank description matches on the weighted vector."""
+        response = self.client.get("/api/books/", {"search": "django"})
+
+        ids = [book["id"] for book in response.data["results"]]
+        self.assertEqual(ids, [self.title_match.pk, self.description_match.pk])
+
+    @skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL")
+    def test_equally_ranked_matches_are_paged_by_id(self):
+        """Results sharing a rank each show up once, best match first."""
+        editions = [
+            Book.objects.create(
+                title="Django for Professionals",
+                author="William Vincent",
+                isbn=f"97817354672{index}0",
+                published_date=timezone.now().date(),
+            ).pk
+            for index in range(5)
+        ]
+
+        with mock.patch.object(KeysetCursorPagination, "offset_cutoff", 1):
+            pages, _ = self.walk({"search": "django", "page_size": 2})
+
+        ids = [book_id for page in pages for book_id in page]
+        self.assertEqual(
+            ids,
+            sorted([self.title_match.pk, *editions], reverse=True)
+            + [self.description_match.pk],
+        )
+
+
+class BookFuzzySearchTests(CursorWalkMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@test.com", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Harry Potter and the Philosopher's Stone",
+            author="J. K. Rowling",
+            isbn="9780747532699",
+            published_date=timezone.now().date(),
+        )
+        Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            isbn="9780441013593",
+            published_date=timezone.now().date(),
+        )
+
+    def test_fuzzy_search_tolerates_typos(self):
+        response = self.client.get("/api/books/", {"search": "harry poter", "fuzzy": 1})
+
+        ids = [book["id"] for book in response.data["results"]]
+        self.assertEqual(ids, [self.book.pk])
+
+    def test_equally_ranked_matches_are_paged_by_id(self):
+        """Fuzzy matches sharing a similarity each show up once."""
+        editions = [
+            Book.objects.create(
+                title="Harry Potter and the Philosopher's Stone",
+                author="J. K. Rowling",
+                isbn=f"97807475326{index}0",
+                published_date=timezone.now().date(),
+            ).pk
+            for index in range(5)
+        ]
+
+        with mock.patch.object(KeysetCursorPagination, "offset_cutoff", 1):
+            pages, _ = self.walk({"search": "harry poter", "fuzzy": 1, "page_size": 2})
+
+        ids = [book_id for page in pages for book_id in page]
+        self.assertEqual(ids, sorted([self.book.pk, *editions], reverse=True))
+
+    def test_fuzzy_search_matches_misspelled_author(self):
+        response = self.client.get("/api/books/", {"search": "rowlng", "fuzzy": 1})
+
+        ids = [book["id"] for book in response.data["results"]]
+        self.assertEqual(ids, [self.book.pk])
+
+    def test_threshold_applies_on_pg_trgm(self):
+        """Scores between the threshold and pg_trgm's own 0.6 still match."""
+        if not pg_trgm_available():
+            self.skipTest("Needs pg_trgm")
+        similarity = (
+            Book.objects.filter(pk=self.book.pk)
+            .annotate(similarity=TrigramWordSimilarity("rowlxyng", "author"))
+            .values_list("similarity", flat=True)
+            .get()
+        )
+        self.assertTrue(FUZZY_SIMILARITY_THRESHOLD <= similarity < 0.6)
+
+        response = self.client.get("/api/books/", {"search": "rowlxyng", "fuzzy": 1})
+
+        ids = [book["id"] for book in response.data["results"]]
+        self.assertEqual(ids, [self.book.pk])
+
+    def test_trigram_table_follows_title_changes(self):
+        if pg_trgm_available():
+            self.skipTest("pg_trgm indexes are used instead of the trigram table")
+        self.book.title = "Dracula"
+        self.book.save()
+
+        grams = set(
+            BookTrigram.objects.filter(book=self.book, field="title").values_list(
+                "trigram", flat=True
+            )
+        )
+        self.assertEqual(grams, trigrams("Dracula"))
+
+
+class BookCacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@test.com", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            isbn="9780441013593",
+            published_date=timezone.now().date(),
+        )
+
+    def test_bump_generation_moves_list_keys(self):
+        old_key = book_list_cache_key("abc")
+        invalidate_book_cache()
+        self.assertNotEqual(book_list_cache_key("abc"), old_key)
+
+    def test_list_is_served_from_cache_until_invalidated(self):
+        self.client.get("/api/books/")
+        Book.objects.filter(pk=self.book.pk).update(available_copies=0)
+
+        response = self.client.get("/api/books/")
+        self.assertEqual(response.data["results"][0]["available_copies"], 1)
+
+        invalidate_book_cache(self.book.pk)
+        response = self.client.get("/api/books/")
+        self.assertEqual(response.data["results"][0]["available_copies"], 0)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        """Only the lock holder recomputes; the other workers reuse its result."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"results": []}
+
+        threads = [
+            threading.Thread(target=single_flight, args=("sf:test", compute, 60))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get("sf:test"), {"results": []})
+
+    def test_uncacheable_results_are_not_stored(self):
+        self.assertIsNone(single_flight("sf:none", lambda: None, 60))
+        self.assertIsNone(cache.get("sf:none"))
+        self.assertIsNone(cache.get("sf:none:lock"))
+
+
+class StaleWhileRevalidateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@test.com", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            isbn="9780441013593",
+            published_date=timezone.now().date(),
+        )
+        self.url = f"/api/books/{self.book.pk}/"
+        self.client.get(self.url)
+        self.cache_key = book_detail_cache_key(self.book.pk)
+        # Rename behind the cache's back and age the entry past its soft expiry
+        Book.objects.filter(pk=self.book.pk).update(title="Dune Messiah")
+        entry = cache.get(self.cache_key)
+        entry["fresh_until"] = time.time() - 1
+        cache.set(self.cache_key, entry, 60)
+
+    def test_stale_entry_is_served_and_refreshed_once(self):
+        with mock.patch("config.tasks.refresh_cached_response.delay") as delay:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.data["title"], "Dune")
+        self.assertEqual(second.data["title"], "Dune")
+        self.assertEqual(delay.call_count, 1)
+
+        # Run the enqueued refresh synchronously
+        refresh_cached_response(*delay.call_args.args)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["title"], "Dune Messiah")
+        self.assertGreater(cache.get(self.cache_key)["fresh_until"], time.time())
+
+    def test_refresh_racing_an_invalidation_is_not_served(self):
+        """Data rendered before a concurrent update never outlives it."""
+        with mock.patch("config.tasks.refresh_cached_response.delay") as delay:
+            self.client.get(self.url)
+
+        def render_then_update(request, pk):
+            data = book_detail_payload(request, pk)
+            # The update commits (and invalidates) while the task renders
+            Book.objects.filter(pk=pk).update(title="Children of Dune")
+            invalidate_book_cache(int(pk))
+            return data
+
+        with mock.patch(
+            "apps.books.payloads.book_detail_payload", side_effect=render_then_update
+        ):
+            refresh_cached_response(*delay.call_args.args)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["title"], "Children of Dune")
+
+    def test_refresh_of_a_deleted_book_drops_the_entry(self):
+        with mock.patch("config.tasks.refresh_cached_response.delay") as delay:
+            self.client.get(self.url)
+        Book.objects.filter(pk=self.book.pk).delete()
+
+        refresh_cached_response(*delay.call_args.args)
+
+        self.assertIsNone(cache.get(self.cache_key))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@test.com", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            isbn="9780441013593",
+            published_date=timezone.now().date(),
+        )
+
+    def test_book_detail_honours_if_none_match(self):
+        url = f"/api/books/{self.book.pk}/"
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        # Gzipping proxies hand back weakened tags
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f"W/{etag}")
+        self.assertEqual(response.status_code, 304)
+
+        Book.objects.filter(pk=self.book.pk).update(title="Dune Messiah")
+        invalidate_book_cache(self.book.pk)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_genre_list_etag_follows_changes(self):
+        etag = self.client.get("/api/academic/genres/")["ETag"]
+        response = self.client.get("/api/academic/genres/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Genre.objects.create(name="Poetry")
+        response = self.client.get("/api/academic/genres/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_etag_follows_user_changes(self):
+        etag = self.client.get("/api/users/profile/")["ETag"]
+        response = self.client.get("/api/users/profile/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = "Ada"
+            self.user.save()
+        response = self.client.get("/api/users/profile/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["first_name"], "Ada")
+
+
+class BookSuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@test.com", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book = Book.objects.create(
+                title="The Left Hand of Darkness",
+                author="Ursula K. Le Guin",
+                isbn="9780441478125",
+                published_date=timezone.now().date(),
+            )
+
+    def test_suggest_matches_word_prefixes(self):
+        expected = [
+            {
+                "id": self.book.pk,
+                "title": "The Left Hand of Darkness",
+                "author": "Ursula K. Le Guin",
+            }
+        ]
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/books/suggest/", {"q": "Left Ha"})
+        self.assertEqual(response.data, expected)
+        self.assertEqual(suggest("darkn"), expected)
+        self.assertEqual(suggest("guin"), expected)
+        self.assertEqual(suggest("hand left"), [])
+        self.assertEqual(suggest(""), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = "Always Coming Home"
+            self.book.save()
+        self.assertEqual(suggest("darkness"), [])
+        self.assertEqual(suggest("always")[0]["title"], "Always Coming Home")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.delete()
+        self.assertEqual(suggest("always"), [])
+        self.assertEqual(suggest("ursula"), [])
+
+    def test_rolled_back_changes_stay_out_of_the_index(self):
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            self.book.title = "Always Coming Home"
+            self.book.save()
+            Book.objects.create(
+                title="Dune",
+                author="Frank Herbert",
+                isbn="9780441013593",
+                published_date=timezone.now().date(),
+            )
+            raise DatabaseError("rolled back")
+
+        self.assertEqual(suggest("always"), [])
+        self.assertEqual(suggest("dune"), [])
+        self.assertEqual(suggest("darkness")[0]["id"], self.book.pk)
+
+    def test_results_are_capped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(SUGGEST_LIMIT + 5):
+                Book.objects.create(
+                    title=f"Dune {index}",
+                    author="Frank Herbert",
+                    isbn=f"97800000001{index:02}",
+                    published_date=timezone.now().date(),
+                )
+        self.assertEqual(len(suggest("dune")), SUGGEST_LIMIT)
+
+    def test_rebuild_command_restores_the_index(self):
+        cache.clear()
+        self.assertEqual(suggest("left"), [])
+        call_command("rebuild_suggest_index", stdout=StringIO())
+        self.assertEqual(suggest("left")[0]["id"], self.book.pk)
+
+
+class BookCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@test.com", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            isbn="9780441013593",
+            published_date=timezone.now().date(),
+        )
+
+    def counters(self):
+        return Book.objects.values(
+            "review_count", "active_queue_length", "lifetime_loans"
+        ).get(pk=self.book.pk)
+
+    def test_counters_follow_write_paths(self):
+        review = Review.objects.create(book=self.book, user=self.user, text="Great")
+        entry = BookQueue.objects.create(book=self.book, user=self.user)
+        Loan.objects.create(book=self.book, user=self.user, due_date=timezone.now())
+        self.assertEqual(
+            self.counters(),
+            {"review_count": 1, "active_queue_length": 1, "lifetime_loans": 1},
+        )
+
+        self.client.delete(f"/api/queues/{entry.pk}/")
+        review.delete()
+        self.assertEqual(
+            self.counters(),
+            {"review_count": 0, "active_queue_length": 0, "lifetime_loans": 1},
+        )
+
+    def test_full_save_keeps_concurrent_increments(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        Review.objects.create(book=self.book, user=self.user, text="Great")
+        stale.available_copies = 0
+        stale.save()
+        self.assertEqual(self.counters()["review_count"], 1)
+
+    def test_list_can_be_ordered_by_counter(self):
+        other = Book.objects.create(
+            title="Emma",
+            author="Jane Austen",
+            isbn="9780141439587",
+            published_date=timezone.now().date(),
+        )
+        Review.objects.create(book=other, user=self.user, text="Witty")
+        response = self.client.get("/api/books/", {"ordering": "-review_count"})
+        results = response.data["results"]
+        self.assertEqual(
+            [(book["title"], book["review_count"]) for book in results],
+            [("Emma", 1), ("Dune", 0)],
+        )
+
+    def test_counter_changes_refresh_the_cached_list(self):
+        def cached_counters():
+            response = self.client.get("/api/books/", {"ordering": "-review_count"})
+            book = response.data["results"][0]
+            return book["review_count"], book["active_queue_length"]
+
+        Book.objects.filter(pk=self.book.pk).update(available_copies=0)
+        self.assertEqual(cached_counters(), (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/books/{self.book.pk}/reviews/", {"text": "Great"})
+        self.assertEqual(cached_counters(), (1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/books/{self.book.pk}/join-queue/")
+        self.assertEqual(cached_counters(), (1, 1))
+
+        entry = BookQueue.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/queues/{entry.pk}/")
+        self.assertEqual(cached_counters(), (1, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Review.objects.create(book=self.book, user=self.user, text="Great")
+        Book.objects.filter(pk=self.book.pk).update(review_count=7, lifetime_loans=3)
+
+        self.assertEqual(reconcile_counters(), [self.book.pk])
+        self.assertEqual(
+            self.counters(),
+            {"review_count": 1, "active_queue_length": 0, "lifetime_loans": 0},
+        )
+        self.assertEqual(reconcile_counters(), [])
+
+
+class CoverUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.librarian = User.objects.create_user(
+            email="librarian@test.com", password="p", role=User.Role.LIBRARIAN
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.librarian)
+
+    def cover(self, color="red"):
+        buffer = BytesIO()
+        Image.new("RGB", (4, 4), color).save(buffer, format="PNG")
+        return SimpleUploadedFile("cover.png", buffer.getvalue(), "image/png")
+
+    def create_book(self):
+        return self.client.post(
+            "/api/books/",
+            {
+                "title": "Dune",
+                "author": "Frank Herbert",
+                "isbn": "111",
+                "published_date": "1965-08-01",
+                "upload_cover_image": self.cover(),
+            },
+            format="multipart",
+        )
+
+    def staged_files(self):
+        return default_storage.listdir(UPLOAD_STAGING_DIR)[1]
+
+    @mock.patch(
+        "apps.site_config.tasks.post_image_to_imgbb",
+        return_value="https://i.ibb.co/cover.png",
+    )
+    def test_cover_is_uploaded_after_the_response(self, post_image):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.create_book()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.data["cover_image_pending"])
+        self.assertIsNone(response.data["cover_image"])
+        post_image.assert_not_called()
+        self.assertEqual(len(self.staged_files()), 1)
+        book = Book.objects.get()
+        self.client.get(f"/api/books/{book.pk}/")  # cached without a cover
+
+        for callback in callbacks:
+            callback()
+
+        book.refresh_from_db()
+        self.assertEqual(book.cover_image, "https://i.ibb.co/cover.png")
+        self.assertEqual(self.staged_files(), [])
+        detail = self.client.get(f"/api/books/{book.pk}/")
+        self.assertEqual(detail.data["cover_image"], "https://i.ibb.co/cover.png")
+        self.assertFalse(detail.data["cover_image_pending"])
+
+    @mock.patch(
+        "apps.site_config.tasks.post_image_to_imgbb",
+        side_effect=[ConnectionError("ImgBB down"), "https://i.ibb.co/cover.png"],
+    )
+    def test_failed_uploads_are_retried(self, post_image):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_book()
+
+        self.assertEqual(post_image.call_count, 2)
+        self.assertEqual(Book.objects.get().cover_image, "https://i.ibb.co/cover.png")
+
+    @mock.patch(
+        "apps.site_config.tasks.post_image_to_imgbb",
+        return_value="https://i.ibb.co/cover.png",
+    )
+    def test_thumbnails_are_written_to_media(self, post_image):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_book()
+
+        book = Book.objects.get()
+        self.assertEqual(len(book.cover_hash), 64)
+        for size, box in THUMBNAIL_SIZES.items():
+            for extension in ("webp", "jpg"):
+                name = thumbnail_name(book.cover_hash, size, extension)
+                with default_storage.open(name) as thumbnail, Image.open(
+                    thumbnail
+                ) as image:
+                    self.assertLessEqual(image.width, box[0])
+
+        listing = self.client.get("/api/books/")
+        self.assertEqual(
+            listing.data["results"][0]["cover_thumbnail"]["webp"],
+            f"/media/{thumbnail_name(book.cover_hash, 'small', 'webp')}",
+        )
+
+    @mock.patch(
+        "apps.site_config.tasks.post_image_to_imgbb",
+        return_value="https://i.ibb.co/cover.png",
+    )
+    def test_duplicate_covers_are_uploaded_once(self, post_image):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_book()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/books/",
+                {
+                    "title": "Dune (2nd edition)",
+                    "author": "Frank Herbert",
+                    "isbn": "222",
+                    "published_date": "1990-01-01",
+                    "upload_cover_image": self.cover(),
+                },
+                format="multipart",
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["cover_image"], "https://i.ibb.co/cover.png")
+        self.assertEqual(post_image.call_count, 1)
+        self.assertEqual(self.staged_files(), [])
+
+    @mock.patch(
+        "apps.site_config.tasks.post_image_to_imgbb",
+        side_effect=["https://i.ibb.co/red.png", "https://i.ibb.co/blue.png"],
+    )
+    def test_new_cover_replaces_the_old_one_only_when_ready(self, post_image):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_book()
+        book = Book.objects.get()
+        red_hash = book.cover_hash
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.patch(
+                f"/api/books/{book.pk}/",
+                {"upload_cover_image": self.cover("blue")},
+                format="multipart",
+            )
+        book.refresh_from_db()
+        self.assertEqual(book.cover_hash, red_hash)
+        self.assertEqual(book.cover_image, "https://i.ibb.co/red.png")
+
+        for callback in callbacks:
+            callback()
+        book.refresh_from_db()
+        self.assertNotEqual(book.cover_hash, red_hash)
+        self.assertEqual(book.cover_image, "https://i.ibb.co/blue.png")
+        self.assertTrue(
+            default_storage.exists(thumbnail_name(book.cover_hash, "small", "webp"))
+        )
+
+    @mock.patch("apps.site_config.tasks.post_image_to_imgbb")
+    def test_cover_without_thumbnails_is_not_published(self, post_image):
+        with mock.patch(
+            "apps.books.tasks.make_thumbnails", side_effect=OSError("disk full")
+        ), self.assertRaises(OSError):
+            # Eager Celery re-raises the failure that stops the chain
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create_book()
+
+        book = Book.objects.get()
+        post_image.assert_not_called()
+        self.assertEqual((book.cover_image, book.cover_hash), (None, ""))
+        self.assertEqual(self.staged_files(), [])
+        listing = self.client.get("/api/books/")
+        self.assertIsNone(listing.data["results"][0]["cover_thumbnail"])
+
+    @mock.patch(
+        "apps.site_config.tasks.post_image_to_imgbb",
+        side_effect=ConnectionError("ImgBB down"),
+    )
+    def test_failed_upload_leaves_no_hash(self, post_image):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_book()
+
+        book = Book.objects.get()
+        self.assertEqual((book.cover_image, book.cover_hash), (None, ""))
+
+    def test_update_without_image_is_not_pending(self):
+        book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            isbn="111",
+            published_date="1965-08-01",
+        )
+
+        response = self.client.patch(f"/api/books/{book.pk}/", {"title": "Dune II"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["cover_image_pending"])
@@ -1,7 +1,7 @@
 import hashlib
 import json
 
-from django.core.cache import cache
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
@@ -9,50 +9,142 @@ from rest_framework.response import Response
 
 from apps.queues.models import BookQueue
 from apps.queues.serializers import JoinQueueSerializer
+from apps.site_config.uploads import accepted_if_pending
 from apps.users.permissions import IsAdminOrLibrarian
+from config.cache import cached_response
 
-from .filters import BookFilter  # Import our new custom filter class
+from .cache import book_detail_cache_key, book_list_cache_key, invalidate_book_cache
+from .filters import BookFilter, BookSearchFilter
 from .models import Book, Review  # Add Review
 from .permissions import IsReviewOwnerOrReadOnly
-from .serializers import BookSerializer, ReviewSerializer
+from .serializers import BookListSerializer, BookSerializer, ReviewSerializer
+from .suggest import suggest
 
 # Cache timeouts (in seconds)
 CACHE_TTL_BOOKS_LIST = 60 * 5  # 5 minutes
 CACHE_TTL_BOOK_DETAIL = 60 * 1  # 1 minute
 
+# How long expired entries may still be served while a background task
+# refreshes them (stale-while-revalidate), on top of the TTLs above
+CACHE_STALE_TTL_BOOKS_LIST = 60 * 30  # 30 minutes
+CACHE_STALE_TTL_BOOK_DETAIL = 60 * 5  # 5 minutes
+
+# Upper bound for ?review_snippets=<n> on the book list
+MAX_REVIEW_SNIPPETS = 5
+
 
 class BookViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing Books with caching.
-    - list: Results are cached for 5 minutes.
-    - retrieve: Book details are cached for 1 minute.
-    - Caches are invalidated on update/destroy.
+    - list: Slim, cursor-paginated by title; each page is fresh for 5 minutes,
+      then served stale for up to 30 more while it is refreshed in the background.
+    - retrieve: Full book details with nested reviews, fresh for 1 minute
+      (plus 5 minutes of stale-while-revalidate).
+    - Caches are invalidated on create/update/destroy by bumping the
+      catalog generation (see apps.books.cache).
+    - suggest: Search-box autocomplete served from a Redis prefix index.
     """
 
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
+    filter_backends = [BookSearchFilter, DjangoFilterBackend, filters.OrderingFilter]
     search_fields = ["title", "author", "isbn", "publisher"]
     filterset_class = BookFilter
+    cursor_ordering = ("title", "id")  # Backed by book_title_id_idx
+    # ?ordering=-review_count etc.; each counter has a (counter, id) index
+    ordering_fields = ["title", "review_count", "active_queue_length", "lifetime_loans"]
+
+    def get_queryset(self):
+        """
+        The list only needs genre slugs (the review count is a column); the
+        nested reviews (with their authors) are only loaded for a single book
+        (see apps.books.payloads.book_detail_payload).
+        """
+        queryset = super().get_queryset()
+        if self.action == "list":
+            queryset = queryset.prefetch_related("genres")
+            snippets = self.get_review_snippet_count()
+            if snippets:
+                queryset = queryset.prefetch_related(
+                    Prefetch(
+                        "reviews",
+                        queryset=Review.objects.select_related("user")[:snippets],
+                        to_attr="latest_reviews",
+                    )
+                )
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return BookListSerializer
+        return BookSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["review_snippets"] = self.get_review_snippet_count()
+        return context
+
+    def get_review_snippet_count(self):
+        """
+        Number of latest reviews to embed per book in the list,
+        taken from `?review_snippets=<n>` and capped at MAX_REVIEW_SNIPPETS.
+        """
+        if self.action != "list":
+            return 0
+        try:
+            requested = int(self.request.query_params.get("review_snippets", 0))
+        except (TypeError, ValueError):
+            return 0
+        return max(0, min(requested, MAX_REVIEW_SNIPPETS))
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve", "join_queue"]:
+        if self.action in ["list", "retrieve", "join_queue", "suggest"]:
             permission_classes = [permissions.IsAuthenticated]
         else:
             # All other actions (create, update, destroy) are restricted.
             permission_classes = [IsAdminOrLibrarian]
         return [permission() for permission in permission_classes]
 
+    @cached_response(
+        key="get_list_cache_key",
+        build="apps.books.payloads.book_list_payload",
+        timeout=CACHE_TTL_BOOKS_LIST,
+        stale_timeout=CACHE_STALE_TTL_BOOKS_LIST,
+    )
     def list(self, request, *args, **kwargs):
         """
         Overrides the default list action to implement caching for search results
-        and filters. The cache key is now generated from all query parameters.
+        and filters. Concurrent misses on the same page are recomputed once.
         """
 
+    @cached_response(
+        key="get_detail_cache_key",
+        build="apps.books.payloads.book_detail_payload",
+        timeout=CACHE_TTL_BOOK_DETAIL,
+        stale_timeout=CACHE_STALE_TTL_BOOK_DETAIL,
+    )
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Overrides the default retrieve action to implement caching for a single book.
+        """
+
+    def get_list_cache_key(self, request, *args, **kwargs):
+        """
+        The cache key is generated from all query parameters.
+        """
         # --- THE FIX: Generate a unique key from all query params ---
+        # The cursor is part of the query params, so every page gets its own
+        # entry. The page size is clamped first so that ?page_size=1000 and
+        # ?page_size=100 share the same (bounded) entry.
+        params = dict(request.query_params.lists())
+        if self.paginator is not None:
+            params[self.paginator.page_size_query_param] = [
+                self.paginator.get_page_size(request)
+            ]
+
         # Sort the query params to ensure the order doesn't change the key
         # e.g., ?a=1&b=2 should have the same key as ?b=2&a=1
-        sorted_params = sorted(request.query_params.items())
+        sorted_params = sorted(params.items())
 
         # Convert the sorted list of tuples to a JSON string
         params_string = json.dumps(sorted_params)
@@ -60,55 +152,50 @@ class BookViewSet(viewsets.ModelViewSet):
         # Hash the string to create a short, fixed-length, and safe cache key
         params_hash = hashlib.md5(params_string.encode("utf-8")).hexdigest()
 
-        cache_key = f"books:list:{params_hash}"
+        # The key carries the catalog generation, so invalidation is one INCR
+        return book_list_cache_key(params_hash)
 
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print(f"--- CACHE HIT for key: {cache_key} ---")  # Optional: for debugging
-            return Response(cached_data)
+    def get_detail_cache_key(self, request, *args, **kwargs):
+        return book_detail_cache_key(self.kwargs.get("pk"))
 
-        print(f"--- CACHE MISS for key: {cache_key} ---")  # Optional: for debugging
-        response = super().list(request, *args, **kwargs)
+    def create(self, request, *args, **kwargs):
+        # 202 while an uploaded cover is still on its way to ImgBB
+        response = super().create(request, *args, **kwargs)
+        return accepted_if_pending(response, "cover_image_pending")
 
-        if response.status_code == 200:
-            cache.set(cache_key, response.data, CACHE_TTL_BOOKS_LIST)
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        return accepted_if_pending(response, "cover_image_pending")
 
-        return response
-
-    def retrieve(self, request, *args, **kwargs):
+    def perform_create(self, serializer):
         """
-        Overrides the default retrieve action to implement caching for a single book.
+        Invalidates the book list cache on create.
         """
-        book_id = self.kwargs.get("pk")
-        cache_key = f"book:detail:{book_id}"
-
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return Response(cached_data)
-
-        response = super().retrieve(request, *args, **kwargs)
-
-        if response.status_code == 200:
-            cache.set(cache_key, response.data, CACHE_TTL_BOOK_DETAIL)
-
-        return response
+        serializer.save()
+        invalidate_book_cache()
 
     def perform_update(self, serializer):
         """
-        Invalidates the book detail cache on update.
+        Invalidates the book detail and list caches on update.
         """
         instance = serializer.save()
-        cache.delete(f"book:detail:{instance.pk}")
-        cache.delete_pattern("books:list:*")
+        invalidate_book_cache(instance.pk)
 
     def perform_destroy(self, instance):
         """
-        Invalidates the book detail cache on delete.
+        Invalidates the book detail and list caches on delete.
         """
         book_id = instance.pk
         instance.delete()
-        cache.delete(f"book:detail:{book_id}")
-        cache.delete_pattern("books:list:*")
+        invalidate_book_cache(book_id)
+
+    @action(detail=False, methods=["get"])
+    def suggest(self, request):
+        """
+        Returns up to 10 {id, title, author} matches for `?q=<prefix>`,
+        without touching the database (see apps.books.suggest).
+        """
+        return Response(suggest(request.query_params.get("q", "")))
 
     @action(detail=True, methods=["post"], url_path="join-queue")
     def join_queue(self, request, pk=None):
@@ -0,0 +1,98 @@
+from collections import defaultdict
+
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from apps.users.models import User
+
+from .fines import overdue_loans
+from .models import Fine, Loan
+
+
+def loans_due_on(day):
+    return Loan.objects.filter(due_date__date=day, is_returned=False)
+
+
+def pending_fines(today):
+    """
+    The pending, non-zero fines of loans that are still overdue on `today`.
+    """
+    return Fine.objects.filter(
+        loan__in=overdue_loans(today),
+        status=Fine.FineStatus.PENDING,
+        amount__gt=0,
+    )
+
+
+def digest_recipients(today):
+    """
+    Users with a loan due tomorrow or a pending fine, i.e. everyone who gets
+    a digest on `today`.
+    """
+    tomorrow = today + timezone.timedelta(days=1)
+    return User.objects.filter(
+        Q(id__in=loans_due_on(tomorrow).values("user_id"))
+        | Q(id__in=pending_fines(today).values("user_id"))
+    )
+
+
+def digests(today, start, end):
+    """
+    One compact, JSON-friendly dict per digest recipient with start <= id <
+    end: their loans due tomorrow, their pending fines and the fine total.
+    Three queries per range, whatever the number of users or loans: the
+    recipients with their fine totals summed in SQL (GROUP BY user), then
+    the due loans and the fines, each ordered by user.
+    """
+    tomorrow = today + timezone.timedelta(days=1)
+    fines = pending_fines(today).filter(user_id__gte=start, user_id__lt=end)
+    fines_total = (
+        fines.filter(user=OuterRef("pk"))
+        .order_by()
+        .values("user")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    users = (
+        digest_recipients(today)
+        .filter(id__gte=start, id__lt=end)
+        .annotate(fines_total=Subquery(fines_total, output_field=DecimalField()))
+        .order_by("id")
+        .values_list("id", "email", "first_name", "fines_total")
+    )
+
+    due_loans = defaultdict(list)
+    rows = (
+        loans_due_on(tomorrow)
+        .filter(user_id__gte=start, user_id__lt=end)
+        .order_by("user_id", "due_date")
+        .values_list("user_id", "book__title", "due_date")
+    )
+    for user_id, title, due_date in rows:
+        due_loans[user_id].append(
+            {"book_title": title, "due_date": due_date.strftime("%A, %B %d, %Y")}
+        )
+
+    overdue = defaultdict(list)
+    rows = fines.order_by("user_id", "loan__due_date").values_list(
+        "user_id", "loan__book__title", "loan__due_date", "amount"
+    )
+    for user_id, title, due_date, amount in rows:
+        overdue[user_id].append(
+            {
+                "book_title": title,
+                "due_date": due_date.strftime("%A, %B %d, %Y"),
+                "fine_amount": f"${amount:.2f}",
+            }
+        )
+
+    return [
+        {
+            "user_email": email,
+            "user_name": first_name,
+            "due_loans": due_loans[user_id],
+            "fines": overdue[user_id],
+            "fines_total": f"${total:.2f}" if total else None,
+        }
+        for user_id, email, first_name, total in users
+    ]
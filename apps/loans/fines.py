@@ -0,0 +1,135 @@
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.books.search import is_postgres
+
+from .models import Fine, Loan
+from .shards import id_ranges
+
+# Creates the fine of every overdue loan in an id range, or updates its
+# amount when it changed, with the amount computed by the database.
+# (xmax = 0) tells rows that were inserted from rows that were updated.
+UPSERT_FINES_SQL = """
+INSERT INTO {fine} (loan_id, user_id, amount, status, created_at, updated_at)
+SELECT
+    loan.id,
+    loan.user_id,
+    (%(today)s::date - (loan.due_date AT TIME ZONE %(tz)s)::date) * %(rate)s,
+    %(pending)s,
+    %(now)s,
+    %(now)s
+FROM {loan} AS loan
+WHERE loan.is_returned = false
+    AND loan.due_date < %(today_start)s
+    AND loan.id >= %(start)s AND loan.id < %(end)s
+ON CONFLICT (loan_id) DO UPDATE
+    SET amount = EXCLUDED.amount, updated_at = EXCLUDED.updated_at
+    WHERE {fine}.amount IS DISTINCT FROM EXCLUDED.amount
+RETURNING (xmax = 0) AS inserted
+"""
+
+
+def overdue_loans(today):
+    """
+    Unreturned loans whose due date (in the current time zone) is before
+    `today`, as a range condition the due_date column can be scanned by.
+    """
+    today_start = timezone.make_aware(datetime.combine(today, time.min))
+    return Loan.objects.filter(is_returned=False, due_date__lt=today_start)
+
+
+def overdue_id_chunks(today, chunk_size=None):
+    """
+    Splits the id span of the overdue loans into [start, end) ranges of
+    CIRCULATION_SHARD_SIZE ids by default.
+    """
+    chunk_size = chunk_size or settings.CIRCULATION_SHARD_SIZE
+    return id_ranges(overdue_loans(today), chunk_size)
+
+
+def accrue_fines(today, fine_per_day, start, end):
+    """
+    Brings the fines of the overdue loans with start <= id < end up to
+    `days overdue * fine_per_day` in one set-based upsert. Returns the
+    (created, updated) counts.
+    """
+    with transaction.atomic():
+        if is_postgres():
+            return _accrue_fines_sql(today, fine_per_day, start, end)
+        return _accrue_fines_orm(today, fine_per_day, start, end)
+
+
+def _accrue_fines_sql(today, fine_per_day, start, end):
+    sql = UPSERT_FINES_SQL.format(fine=Fine._meta.db_table, loan=Loan._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            {
+                "today": today,
+                "today_start": timezone.make_aware(datetime.combine(today, time.min)),
+                "tz": timezone.get_current_timezone_name(),
+                "rate": fine_per_day,
+                "pending": Fine.FineStatus.PENDING,
+                "now": timezone.now(),
+                "start": start,
+                "end": end,
+            },
+        )
+        inserted = [row[0] for row in cursor.fetchall()]
+    return inserted.count(True), inserted.count(False)
+
+
+def _accrue_fines_orm(today, fine_per_day, start, end):
+    loans = overdue_loans(today).filter(id__gte=start, id__lt=end)
+    current = dict(
+        Fine.objects.filter(loan__in=loans).values_list("loan_id", "amount")
+    )
+    fines = []
+    for loan_id, user_id, due_date in loans.values_list("id", "user_id", "due_date"):
+        days_overdue = (today - timezone.localtime(due_date).date()).days
+        amount = days_overdue * fine_per_day
+        if current.get(loan_id) != amount:
+            fines.append(Fine(loan_id=loan_id, user_id=user_id, amount=amount))
+    Fine.objects.bulk_create(
+        fines,
+        update_conflicts=True,
+        unique_fields=["loan"],
+        update_fields=["amount", "updated_at"],
+    )
+    created = sum(1 for fine in fines if fine.loan_id not in current)
+    return created, len(fines) - created
+
+
+def fine_notifications(today, start, end):
+    """
+    The pending, non-zero fines of the overdue loans in an id range, as
+    compact JSON-friendly dicts holding just what the notification needs.
+    """
+    rows = (
+        Fine.objects.filter(
+            loan__in=overdue_loans(today).filter(id__gte=start, id__lt=end),
+            status=Fine.FineStatus.PENDING,
+            amount__gt=0,
+        )
+        .order_by("loan_id")
+        .values_list(
+            "user__email",
+            "user__first_name",
+            "loan__book__title",
+            "loan__due_date",
+            "amount",
+        )
+    )
+    return [
+        {
+            "user_email": email,
+            "user_name": first_name,
+            "book_title": title,
+            "due_date": due_date.strftime("%A, %B %d, %Y"),
+            "fine_amount": f"${amount:.2f}",
+        }
+        for email, first_name, title, due_date, amount in rows
+    ]
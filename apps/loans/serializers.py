@@ -1,8 +1,11 @@
 from dateutil.relativedelta import relativedelta
-from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from rest_framework import serializers
 
+from apps.books.cache import invalidate_book_cache
+from apps.books.models import Book
 from apps.queues.models import BookQueue
 from apps.site_config.models import LibrarySettings
 
@@ -52,29 +55,42 @@ class CreateLoanSerializer(serializers.ModelSerializer):
         return book
 
     def create(self, validated_data):
+        """
+        Checks the book out in one transaction. The copy is taken with a
+        conditional UPDATE rather than a read-then-save, so of two borrowers
+        racing for the last copy exactly one matches; no SELECT FOR UPDATE.
+        """
         book = validated_data["book"]
         user = self.context["request"].user
         settings = LibrarySettings.get_solo()
 
-        reservation = BookQueue.objects.filter(
-            book=book, user=user, status=BookQueue.QueueStatus.RESERVED
-        ).first()
-
-        if reservation:
-            reservation.status = BookQueue.QueueStatus.FULFILLED
-            reservation.save()
-        else:
-            book.available_copies -= 1
-            book.save()
-
-        cache.delete(f"book:detail:{book.pk}")
-        cache.delete_pattern("books:list:*")
-
-        loan = Loan.objects.create(
-            book=book,
-            user=user,
-            due_date=timezone.now() + relativedelta(days=settings.loan_duration_days),
-        )
+        with transaction.atomic():
+            # A reservation already holds a copy for this user
+            fulfilled = BookQueue.objects.filter(
+                book=book, user=user, status=BookQueue.QueueStatus.RESERVED
+            ).update(status=BookQueue.QueueStatus.FULFILLED)
+
+            if not fulfilled:
+                taken = Book.objects.filter(
+                    pk=book.pk, available_copies__gt=0
+                ).update(available_copies=F("available_copies") - 1)
+                if not taken:
+                    raise serializers.ValidationError(
+                        {
+                            "book": [
+                                "This book is not currently available. "
+                                "Please join the queue."
+                            ]
+                        }
+                    )
+
+            loan = Loan.objects.create(
+                book=book,
+                user=user,
+                due_date=timezone.now()
+                + relativedelta(days=settings.loan_duration_days),
+            )
+            transaction.on_commit(lambda: invalidate_book_cache(book.pk))
         return loan
 
 
@@ -0,0 +1,16 @@
+from django.db.models import Max, Min
+
+
+def id_ranges(queryset, size):
+    """
+    Splits the id span of `queryset` into [start, end) ranges of `size` ids,
+    the unit of work of the sharded daily circulation jobs. Ranges are
+    computed from MIN/MAX alone, so sparse spans may yield empty shards.
+    """
+    bounds = queryset.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        return []
+    return [
+        (start, min(start + size, bounds["high"] + 1))
+        for start in range(bounds["low"], bounds["high"] + 1, size)
+    ]
@@ -1,94 +1,221 @@
-from celery import shared_task
+import logging
+import time
+from datetime import date
+from decimal import Decimal
+
+from celery import chord, shared_task
 from django.conf import settings
 from django.utils import timezone
 
 from apps.site_config.models import LibrarySettings
-from apps.users.tasks import send_verification_email_task
+from apps.users.tasks import email_message, queue_bulk_emails
+
+from .digest import digest_recipients, digests, loans_due_on
+from .fines import accrue_fines, fine_notifications, overdue_id_chunks
+from .shards import id_ranges
+
+logger = logging.getLogger(__name__)
+
+
+def dispatch_shards(job, shards):
+    """
+    Runs the shard task signatures of a daily job as a chord, so they spread
+    over all workers, with summarize_shards as the callback.
+    """
+    if not shards:
+        return f"No {job} to process."
+    chord(shards)(summarize_shards.s(job))
+    return f"Dispatched {len(shards)} {job} shards."
+
 
-from .models import Fine, Loan
+@shared_task
+def summarize_shards(results, job):
+    """
+    Chord callback: logs each shard's timing and totals the shard counters.
+    """
+    totals = {}
+    for result in results:
+        logger.info(
+            "%s shard %s-%s took %.3fs: %s",
+            job,
+            *result["shard"],
+            result["seconds"],
+            result["counts"],
+        )
+        for name, value in result["counts"].items():
+            totals[name] = totals.get(name, 0) + value
+    slowest = max(result["seconds"] for result in results)
+    counts = ", ".join(f"{value} {name}" for name, value in totals.items())
+    return f"{job}: {counts} over {len(results)} shards (slowest {slowest:.3f}s)."
+
+
+def shard_result(start, end, started, **counts):
+    return {
+        "shard": [start, end],
+        "seconds": time.monotonic() - started,
+        "counts": counts,
+    }
 
 
 @shared_task
 def send_due_date_reminders():
     """
-    Finds loans due tomorrow and sends a reminder email.
+    Finds loans due tomorrow and sends a reminder email, fanned out over
+    id-range shards of CIRCULATION_SHARD_SIZE loans. Skipped when the
+    reminders go out in the daily digest instead.
     """
+    if settings.EMAIL_DIGEST_ENABLED:
+        return "Due date reminders are sent in the daily digest."
     tomorrow = timezone.now().date() + timezone.timedelta(days=1)
-    loans_due_tomorrow = Loan.objects.filter(due_date__date=tomorrow, is_returned=False)
+    shards = id_ranges(loans_due_on(tomorrow), settings.CIRCULATION_SHARD_SIZE)
+    return dispatch_shards(
+        "due date reminders",
+        [
+            send_due_date_reminders_shard.s(tomorrow.isoformat(), start, end)
+            for start, end in shards
+        ],
+    )
 
-    for loan in loans_due_tomorrow:
-        user = loan.user
-        book = loan.book
-        subject = f"Reminder: Your book '{book.title}' is due tomorrow!"
-        account_path = "/loans/"
-        full_cta_url = f"{settings.FRONTEND_BASE_URL}{account_path}"
 
+@shared_task
+def send_due_date_reminders_shard(day, start, end):
+    started = time.monotonic()
+    rows = (
+        loans_due_on(date.fromisoformat(day))
+        .filter(id__gte=start, id__lt=end)
+        .values_list("due_date", "user__email", "user__first_name", "book__title")
+    )
+    account_path = "/loans/"
+    full_cta_url = f"{settings.FRONTEND_BASE_URL}{account_path}"
+
+    messages = []
+    for due_date, email, first_name, title in rows:
+        subject = f"Reminder: Your book '{title}' is due tomorrow!"
         context = {
             "email_title": "Due Date Reminder",
-            "user_name": user.first_name,
-            "user_email": user.email,
-            "book_title": book.title,
-            "due_date": loan.due_date.strftime("%A, %B %d, %Y"),
+            "user_name": first_name,
+            "user_email": email,
+            "book_title": title,
+            "due_date": due_date.strftime("%A, %B %d, %Y"),
             "cta_url": full_cta_url,
             "cta_text": "View Your Loans",
         }
-        send_verification_email_task.delay(
-            subject, "emails/due_date_reminder.html", context, [user.email]
+        messages.append(
+            email_message(subject, "emails/due_date_reminder.html", context, [email])
         )
-    return f"Sent {loans_due_tomorrow.count()} due date reminders."
+    queue_bulk_emails(messages)
+    return shard_result(start, end, started, reminders=len(messages))
 
 
 @shared_task
 def calculate_and_notify_fines():
     """
     A daily task to calculate fines for all overdue, unreturned books.
-    If a fine is active and greater than 0, it sends a notification.
+    Fines are accrued with set-based upserts, one id-range shard per task
+    (see fines.py); every pending fine greater than 0 gets a notification.
     """
-    settings = LibrarySettings.get_solo()
-    fine_per_day = settings.fine_per_day
+    library_settings = LibrarySettings.get_solo()
+    fine_per_day = library_settings.fine_per_day
 
     if fine_per_day <= 0:
         return "Fine system is disabled (fine per day is 0 or less)."
 
     today = timezone.now().date()
+    return dispatch_shards(
+        "fines",
+        [
+            calculate_and_notify_fines_shard.s(
+                today.isoformat(), str(fine_per_day), start, end
+            )
+            for start, end in overdue_id_chunks(today)
+        ],
+    )
 
-    overdue_loans = Loan.objects.filter(due_date__date__lt=today, is_returned=False)
 
-    fines_updated = 0
-    notifications_sent = 0
+@shared_task
+def calculate_and_notify_fines_shard(day, fine_per_day, start, end):
+    started = time.monotonic()
+    today = date.fromisoformat(day)
+    created, updated = accrue_fines(today, Decimal(fine_per_day), start, end)
+    notifications = []
+    if not settings.EMAIL_DIGEST_ENABLED:
+        notifications = fine_notifications(today, start, end)
+        send_fine_notifications(notifications)
+    return shard_result(
+        start,
+        end,
+        started,
+        created=created,
+        updated=updated,
+        notified=len(notifications),
+    )
+
+
+def send_fine_notifications(notifications):
+    """
+    Email stage: one notification per entry of fine_notifications(), sent
+    in batches by send_bulk_email_task.
+    """
+    subject = "Action Required: Overdue Book and Fine Notification"
+    messages = []
+    for notification in notifications:
+        context = {
+            "email_title": "Overdue Book Notice",
+            **notification,
+            "main_message": f"Our records show that the book '{notification['book_title']}' is overdue. A fine has been applied to your account.",
+            "alert_message": "Please return the book as soon as possible to prevent further fines. You can view your account details by clicking the button below.",
+            "cta_url": f"{settings.FRONTEND_BASE_URL}/account/fines/",
+            "cta_text": "View My Fines",
+        }
+        messages.append(
+            email_message(
+                subject,
+                "emails/fine_notification.html",
+                context,
+                [notification["user_email"]],
+            )
+        )
+    queue_bulk_emails(messages)
 
-    for loan in overdue_loans:
-        days_overdue = (today - loan.due_date.date()).days
-        calculated_fine = days_overdue * fine_per_day
 
-        fine, created = Fine.objects.get_or_create(
-            loan=loan, user=loan.user, defaults={"amount": calculated_fine}
-        )
+@shared_task
+def send_daily_digests():
+    """
+    Sends each user one email listing all their loans due tomorrow and their
+    pending fines, in place of the per-loan reminders and fine notices, when
+    EMAIL_DIGEST_ENABLED is set. Fanned out over id-range shards of
+    CIRCULATION_SHARD_SIZE users; runs after the fines are accrued.
+    """
+    if not settings.EMAIL_DIGEST_ENABLED:
+        return "Daily digest is disabled."
+
+    today = timezone.now().date()
+    shards = id_ranges(digest_recipients(today), settings.CIRCULATION_SHARD_SIZE)
+    return dispatch_shards(
+        "digests",
+        [
+            send_daily_digests_shard.s(today.isoformat(), start, end)
+            for start, end in shards
+        ],
+    )
 
-        if not created and fine.amount != calculated_fine:
-            fine.amount = calculated_fine
-            fine.save()
-            fines_updated += 1
-
-        if fine.status == Fine.FineStatus.PENDING and fine.amount > 0:
-            user = loan.user
-            book = loan.book
-            subject = f"Action Required: Overdue Book and Fine Notification"
-            context = {
-                "email_title": "Overdue Book Notice",
-                "user_name": user.first_name,
-                "user_email": user.email,
-                "main_message": f"Our records show that the book '{book.title}' is overdue. A fine has been applied to your account.",
-                "book_title": book.title,
-                "due_date": loan.due_date.strftime("%A, %B %d, %Y"),
-                "fine_amount": f"${fine.amount:.2f}",
-                "alert_message": "Please return the book as soon as possible to prevent further fines. You can view your account details by clicking the button below.",
-                "cta_url": f"{settings.FRONTEND_BASE_URL}/account/fines/",
-                "cta_text": "View My Fines",
-            }
-            send_verification_email_task.delay(
-                subject, "emails/fine_notification.html", context, [user.email]
-            )
-            notifications_sent += 1
 
-    return f"Processed {overdue_loans.count()} overdue loans. Updated {fines_updated} fines. Sent {notifications_sent} notifications."
+@shared_task
+def send_daily_digests_shard(day, start, end):
+    started = time.monotonic()
+    messages = [
+        email_message(
+            "Your Metro Reads daily summary",
+            "emails/daily_digest.html",
+            {
+                "email_title": "Your Daily Library Summary",
+                **digest,
+                "cta_url": f"{settings.FRONTEND_BASE_URL}/loans/",
+                "cta_text": "View Your Loans",
+            },
+            [digest["user_email"]],
+        )
+        for digest in digests(date.fromisoformat(day), start, end)
+    ]
+    queue_bulk_emails(messages)
+    return shard_result(start, end, started, digests=len(messages))
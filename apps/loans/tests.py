@@ -1,23 +1,46 @@
+import threading
 from datetime import timedelta
+from decimal import Decimal
 
-from django.test import TestCase
+from django.db import connection
+from django.core import mail
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
 from django.utils import timezone
+from rest_framework.test import APIClient
 
 from apps.books.models import Book
 from apps.site_config.models import LibrarySettings
 from apps.users.models import User
 
-from .models import Loan
-from .tasks import calculate_and_notify_fines
+from .digest import digests
+from .fines import accrue_fines, fine_notifications, overdue_id_chunks
+from .models import Fine, Loan
+from .tasks import (
+    calculate_and_notify_fines,
+    send_daily_digests,
+    send_due_date_reminders,
+    summarize_shards,
+)
 
 
 class FineCalculationTests(TestCase):
     def setUp(self):
-        LibrarySettings.get_solo().fine_per_day = 0.50
-        LibrarySettings.get_solo().save()
+        library_settings = LibrarySettings.get_solo()
+        library_settings.fine_per_day = 0.50
+        library_settings.save()
 
         self.user = User.objects.create_user(email="member@test.com", password="p")
-        self.book = Book.objects.create(title="Test Book", author="Author", isbn="111")
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            isbn="111",
+            published_date=timezone.now().date(),
+        )
 
         self.loan = Loan.objects.create(
             user=self.user, book=self.book, due_date=timezone.now() - timedelta(days=1)
@@ -30,3 +53,197 @@ class FineCalculationTests(TestCase):
         self.loan.refresh_from_db()
         self.assertTrue(hasattr(self.loan, "fine"))
         self.assertEqual(self.loan.fine.amount, 0.50)
+
+    def test_fines_are_upserted_in_chunks(self):
+        other = Loan.objects.create(
+            user=self.user, book=self.book, due_date=timezone.now() - timedelta(days=3)
+        )
+        Loan.objects.create(
+            user=self.user, book=self.book, due_date=timezone.now() + timedelta(days=3)
+        )
+        today = timezone.now().date()
+        chunks = overdue_id_chunks(today, chunk_size=1)
+        self.assertEqual(len(chunks), other.pk - self.loan.pk + 1)
+
+        totals = [accrue_fines(today, Decimal("0.50"), *chunk) for chunk in chunks]
+        self.assertEqual(sum(created for created, _ in totals), 2)
+        self.assertEqual(Fine.objects.get(loan=other).amount, Decimal("1.50"))
+
+        # Unchanged amounts are not rewritten; a new day's accrual is
+        self.assertEqual(accrue_fines(today, Decimal("0.50"), *chunks[0]), (0, 0))
+        tomorrow = today + timedelta(days=1)
+        self.assertEqual(accrue_fines(tomorrow, Decimal("0.50"), *chunks[0]), (0, 1))
+        self.assertEqual(Fine.objects.get(loan=self.loan).amount, Decimal("1.00"))
+
+    def test_notifications_are_compact_and_skip_settled_fines(self):
+        calculate_and_notify_fines()
+        today = timezone.now().date()
+        chunk = (self.loan.pk, self.loan.pk + 1)
+        self.assertEqual(
+            fine_notifications(today, *chunk),
+            [
+                {
+                    "user_email": "member@test.com",
+                    "user_name": "",
+                    "book_title": "Test Book",
+                    "due_date": self.loan.due_date.strftime("%A, %B %d, %Y"),
+                    "fine_amount": "$0.50",
+                }
+            ],
+        )
+        Fine.objects.update(status=Fine.FineStatus.PAID)
+        self.assertEqual(fine_notifications(today, *chunk), [])
+
+
+@override_settings(CIRCULATION_SHARD_SIZE=2)
+class ShardedCirculationJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="member@test.com", password="p")
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            isbn="111",
+            published_date=timezone.now().date(),
+        )
+
+    def test_reminders_fan_out_over_shards(self):
+        tomorrow = timezone.now() + timedelta(days=1)
+        for _ in range(5):
+            Loan.objects.create(user=self.user, book=self.book, due_date=tomorrow)
+
+        result = send_due_date_reminders()
+
+        self.assertEqual(result, "Dispatched 3 due date reminders shards.")
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_fines_fan_out_over_shards(self):
+        for _ in range(3):
+            Loan.objects.create(
+                user=self.user,
+                book=self.book,
+                due_date=timezone.now() - timedelta(days=2),
+            )
+
+        self.assertEqual(calculate_and_notify_fines(), "Dispatched 2 fines shards.")
+        self.assertEqual(Fine.objects.count(), 3)
+
+    def test_summary_totals_shard_counts(self):
+        results = [
+            {"shard": [1, 3], "seconds": 0.2, "counts": {"created": 2, "updated": 0}},
+            {"shard": [3, 5], "seconds": 0.5, "counts": {"created": 1, "updated": 1}},
+        ]
+        self.assertEqual(
+            summarize_shards(results, "fines"),
+            "fines: 3 created, 1 updated over 2 shards (slowest 0.500s).",
+        )
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """
+    Runs real concurrent transactions, so it needs a database with row
+    locking (PostgreSQL); SQLite serializes all writers anyway.
+    """
+
+    borrowers = 10
+
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            isbn="111",
+            published_date=timezone.now().date(),
+        )
+        self.users = [
+            User.objects.create_user(email=f"member{i}@test.com", password="p")
+            for i in range(self.borrowers)
+        ]
+
+    def test_only_one_borrower_gets_the_last_copy(self):
+        barrier = threading.Barrier(self.borrowers)
+        statuses = []
+
+        def borrow(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                response = client.post("/api/loans/", {"book": self.book.pk})
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=borrow, args=(u,)) for u in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.book.refresh_from_db()
+        self.assertEqual(sorted(statuses), [201] + [400] * (self.borrowers - 1))
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(Loan.objects.filter(book=self.book).count(), 1)
+
+
+@override_settings(EMAIL_DIGEST_ENABLED=True, EMAIL_RATE_LIMIT=0)
+class DailyDigestTests(TestCase):
+    def setUp(self):
+        library_settings = LibrarySettings.get_solo()
+        library_settings.fine_per_day = 0.50
+        library_settings.save()
+
+        self.user = User.objects.create_user(
+            email="member@test.com", password="p", first_name="Ada"
+        )
+        self.other = User.objects.create_user(email="other@test.com", password="p")
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            isbn="111",
+            published_date=timezone.now().date(),
+        )
+        tomorrow = timezone.now() + timedelta(days=1)
+        for _ in range(2):
+            Loan.objects.create(user=self.user, book=self.book, due_date=tomorrow)
+            Loan.objects.create(
+                user=self.user,
+                book=self.book,
+                due_date=timezone.now() - timedelta(days=2),
+            )
+        Loan.objects.create(user=self.other, book=self.book, due_date=tomorrow)
+
+    def test_one_digest_per_user(self):
+        calculate_and_notify_fines()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            send_due_date_reminders(),
+            "Due date reminders are sent in the daily digest.",
+        )
+
+        self.assertEqual(send_daily_digests(), "Dispatched 1 digests shards.")
+
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(m for m in mail.outbox if m.to == ["member@test.com"])
+        html = digest.alternatives[0].content
+        self.assertIn("Ada", html)
+        self.assertIn("Due Tomorrow (2)", html)
+        self.assertIn("Overdue Items (2)", html)
+        self.assertIn("$2.00", html)
+
+    def test_digests_are_grouped_in_three_queries(self):
+        calculate_and_notify_fines()
+        today = timezone.now().date()
+
+        with self.assertNumQueries(3):
+            result = digests(today, 0, self.other.pk + 1)
+
+        by_email = {digest["user_email"]: digest for digest in result}
+        self.assertEqual(len(by_email["member@test.com"]["due_loans"]), 2)
+        self.assertEqual(len(by_email["member@test.com"]["fines"]), 2)
+        self.assertEqual(by_email["member@test.com"]["fines_total"], "$2.00")
+        self.assertEqual(by_email["other@test.com"]["fines"], [])
+        self.assertIsNone(by_email["other@test.com"]["fines_total"])
+
+    @override_settings(EMAIL_DIGEST_ENABLED=False)
+    def test_disabled_when_setting_off(self):
+        self.assertEqual(send_daily_digests(), "Daily digest is disabled.")
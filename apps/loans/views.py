@@ -1,10 +1,14 @@
-from django.core.cache import cache
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from apps.queues.tasks import promote_next_in_queue
+from apps.books.cache import invalidate_book_cache
+from apps.queues.promotion import release_copies
+from apps.queues.tasks import schedule_promotion
+from apps.site_config.models import LibrarySettings
 from apps.users.permissions import IsAdminOrLibrarian
 
 from .models import Fine, Loan
@@ -79,7 +83,7 @@ class LoanViewSet(viewsets.ModelViewSet):
             )
 
         # Check if another user is in the queue
-        if loan.book.queues.filter(status="ACTIVE").exists():
+        if loan.book.active_queue_length > 0:
             return Response(
                 {
                     "detail": "Cannot renew this loan as other members are waiting in the queue."
@@ -98,22 +102,25 @@ class LoanViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"], url_path="return")
     def return_book(self, request, pk=None):
         loan = self.get_object()
-        if loan.is_returned:
-            return Response(
-                {"detail": "This book has already been returned."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        now = timezone.now()
 
-        loan.is_returned = True
-        loan.return_date = timezone.now()
-        loan.save()
-
-        book = loan.book
-
-        promote_next_in_queue.delay(book.id)
-
-        cache.delete(f"book:detail:{book.pk}")
-        cache.delete_pattern("books:list:*")
+        with transaction.atomic():
+            # Conditional UPDATE: of two concurrent returns, only one matches
+            returned = Loan.objects.filter(pk=loan.pk, is_returned=False).update(
+                is_returned=True, return_date=now
+            )
+            if not returned:
+                return Response(
+                    {"detail": "This book has already been returned."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            book_id = loan.book_id
+            release_copies(book_id)
+            # The worker must not pick up the task before the return is visible
+            transaction.on_commit(lambda: schedule_promotion(book_id))
+            transaction.on_commit(lambda: invalidate_book_cache(book_id))
+
+        loan.is_returned, loan.return_date = True, now
 
         serializer = self.get_serializer(loan)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -0,0 +1,176 @@
+import json
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+
+from .models import BookQueue
+
+# Prefix of the per-book sorted sets: member = user id, score = join time
+QUEUE_INDEX_PREFIX = "queues:active:"
+
+# Entries written per Redis round trip when rebuilding
+QUEUE_INDEX_REBUILD_BATCH_SIZE = 1000
+
+# Set while rebuild() runs; writers then also log their changes to the
+# journal, which the rebuild replays onto the new sets before they go live
+QUEUE_INDEX_REBUILDING_KEY = "queues:index:rebuilding"
+QUEUE_INDEX_JOURNAL_KEY = "queues:index:journal"
+
+# Both expire after this long (in seconds) if a rebuild dies halfway
+QUEUE_INDEX_REBUILD_TIMEOUT = 60 * 60
+
+
+def enabled():
+    return settings.QUEUE_INDEX_ENABLED
+
+
+def queue_key(book_id):
+    return f"{QUEUE_INDEX_PREFIX}{book_id}"
+
+
+def journal(redis, change):
+    """
+    Logs a change for rebuild() to replay, while one is running. Called
+    before the change is applied, so a rebuild that swaps its sets in
+    between still sees it (see _swap).
+    """
+    if redis.get(QUEUE_INDEX_REBUILDING_KEY):
+        with redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(QUEUE_INDEX_JOURNAL_KEY, json.dumps(change))
+            pipe.expire(QUEUE_INDEX_JOURNAL_KEY, QUEUE_INDEX_REBUILD_TIMEOUT)
+            pipe.execute()
+
+
+def add_entry(book_id, user_id, joined_at):
+    redis = get_redis_connection("default")
+    score = joined_at.timestamp()
+    journal(redis, ["add", book_id, user_id, score])
+    redis.zadd(queue_key(book_id), {user_id: score})
+
+
+def remove_entries(book_id, user_ids):
+    if user_ids:
+        redis = get_redis_connection("default")
+        journal(redis, ["remove", book_id, list(user_ids)])
+        redis.zrem(queue_key(book_id), *user_ids)
+
+
+def sync_entry(entry):
+    """
+    Mirrors one BookQueue row: present in its book's set while ACTIVE.
+    """
+    if entry.status == BookQueue.QueueStatus.ACTIVE:
+        add_entry(entry.book_id, entry.user_id, entry.created_at)
+    else:
+        remove_entries(entry.book_id, [entry.user_id])
+
+
+def is_queued(book_id, user_id):
+    redis = get_redis_connection("default")
+    return redis.zscore(queue_key(book_id), user_id) is not None
+
+
+def annotate_positions(entries):
+    """
+    Sets `position` on a page of BookQueue entries with one pipelined round
+    trip, instead of the SQL ranking subquery.
+    """
+    with get_redis_connection("default").pipeline(transaction=False) as pipe:
+        for entry in entries:
+            pipe.zrank(queue_key(entry.book_id), entry.user_id)
+        ranks = pipe.execute()
+    for entry, rank in zip(entries, ranks):
+        entry.position = None if rank is None else rank + 1
+
+
+def snapshot():
+    """
+    (book_id, user_id, created_at) of every ACTIVE entry, streamed by book.
+    """
+    return (
+        BookQueue.objects.filter(status=BookQueue.QueueStatus.ACTIVE)
+        .order_by("book_id")
+        .values_list("book_id", "user_id", "created_at")
+        .iterator(chunk_size=QUEUE_INDEX_REBUILD_BATCH_SIZE)
+    )
+
+
+def rebuild():
+    """
+    Rebuilds every book's sorted set from the ACTIVE BookQueue rows. Each set
+    is filled under a temporary key from a snapshot of the table, and swapped
+    in with RENAME once the changes journaled since the snapshot have been
+    replayed, so no index write made during the rebuild is lost. Sets of
+    books with no active entries left are deleted. Returns the number of
+    entries in the snapshot.
+    """
+    redis = get_redis_connection("default")
+    # Every write committed after this is journaled; every earlier one is
+    # in the snapshot, which starts after it
+    if not redis.set(
+        QUEUE_INDEX_REBUILDING_KEY, 1, nx=True, ex=QUEUE_INDEX_REBUILD_TIMEOUT
+    ):
+        raise RuntimeError("Another rebuild of the queue index is running.")
+
+    try:
+        redis.delete(QUEUE_INDEX_JOURNAL_KEY)  # Left over by a dead rebuild
+        count = 0
+        books = set()
+        pipe = redis.pipeline(transaction=False)
+        for book_id, user_id, created_at in snapshot():
+            if book_id not in books:
+                books.add(book_id)
+                pipe.delete(f"{queue_key(book_id)}:rebuild")
+            pipe.zadd(
+                f"{queue_key(book_id)}:rebuild", {user_id: created_at.timestamp()}
+            )
+            count += 1
+            if count % QUEUE_INDEX_REBUILD_BATCH_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+        _swap(redis, books)
+    except BaseException:
+        redis.delete(QUEUE_INDEX_REBUILDING_KEY, QUEUE_INDEX_JOURNAL_KEY)
+        raise
+    return count
+
+
+def _swap(redis, books):
+    """
+    In one MULTI: renames the rebuilt sets over the live ones, deletes the
+    sets of books missing from the snapshot, replays the journal on top and
+    ends the rebuild. WATCHing the journal retries the whole step if a
+    writer logs a change meanwhile.
+    """
+    with redis.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(QUEUE_INDEX_JOURNAL_KEY)
+                changes = [
+                    json.loads(change)
+                    for change in pipe.lrange(QUEUE_INDEX_JOURNAL_KEY, 0, -1)
+                ]
+                stale = [
+                    key
+                    for key in redis.scan_iter(match=f"{QUEUE_INDEX_PREFIX}*")
+                    if not key.decode().endswith(":rebuild")
+                    and int(key.decode().removeprefix(QUEUE_INDEX_PREFIX))
+                    not in books
+                ]
+                pipe.multi()
+                for book_id in books:
+                    pipe.rename(f"{queue_key(book_id)}:rebuild", queue_key(book_id))
+                if stale:
+                    pipe.delete(*stale)
+                for operation, book_id, *args in changes:
+                    if operation == "add":
+                        user_id, score = args
+                        pipe.zadd(queue_key(book_id), {user_id: score})
+                    else:
+                        pipe.zrem(queue_key(book_id), *args[0])
+                pipe.delete(QUEUE_INDEX_REBUILDING_KEY, QUEUE_INDEX_JOURNAL_KEY)
+                pipe.execute()
+                return
+            except WatchError:
+                continue
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.queues import index
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the Redis mirror of the active book queues from the database.
+    Run it on startup and whenever the index may have drifted (e.g. after a
+    Redis flush). Does nothing unless QUEUE_INDEX_ENABLED is set.
+    """
+
+    help = "Rebuilds the Redis sorted-set index of active book queues."
+
+    def handle(self, *args, **options):
+        if not index.enabled():
+            self.stdout.write(
+                self.style.WARNING("QUEUE_INDEX_ENABLED is off. Skipping.")
+            )
+            return
+
+        started = time.monotonic()
+        try:
+            count = index.rebuild()
+        except RuntimeError as e:
+            raise CommandError(e)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {count} queue entries in {time.monotonic() - started:.2f}s."
+            )
+        )
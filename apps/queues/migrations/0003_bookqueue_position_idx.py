@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_book_counters'),
+        ('queues', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookqueue',
+            index=models.Index(fields=['book', 'status', 'created_at'], name='queue_book_status_created_idx'),
+        ),
+    ]
@@ -31,6 +31,13 @@ class BookQueue(models.Model):
     class Meta:
         ordering = ["created_at"]
         unique_together = ("book", "user")
+        indexes = [
+            # Serves the per-book queue position ranking (see QueueViewSet)
+            models.Index(
+                fields=["book", "status", "created_at"],
+                name="queue_book_status_created_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
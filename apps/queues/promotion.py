@@ -0,0 +1,178 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from apps.books.cache import invalidate_book_cache
+from apps.books.counters import decrement_counter
+from apps.books.models import Book
+from apps.books.search import is_postgres
+from apps.site_config.models import LibrarySettings
+
+from . import index
+from .models import BookQueue
+
+# Expired reservations flipped per statement by the expiry sweep
+EXPIRY_BATCH_SIZE = 500
+
+# One statement per batch: claim a batch of expired reservations (skipping
+# rows another sweep holds), mark them EXPIRED, and put their copies back
+# on the shelf, returning how many copies each book got back.
+EXPIRE_RESERVATIONS_SQL = """
+WITH batch AS (
+    SELECT id FROM {queue}
+    WHERE status = %(reserved)s AND expires_at < %(now)s
+    ORDER BY id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+), expired AS (
+    UPDATE {queue} AS q SET status = %(expired)s
+    FROM batch WHERE q.id = batch.id
+    RETURNING q.book_id
+), released AS (
+    SELECT book_id, COUNT(*) AS copies FROM expired GROUP BY book_id
+)
+UPDATE {book} AS b
+SET available_copies = LEAST(b.available_copies + released.copies, b.total_copies)
+FROM released WHERE b.id = released.book_id
+RETURNING b.id, released.copies
+"""
+
+
+def release_copies(book_id, count=1):
+    """
+    Puts `count` copies back on the shelf (a return, or an expired
+    reservation) with a single F() update, capped at total_copies so a
+    duplicate release can never put more copies on the shelf than the library
+    owns. Call promote_queue_heads afterwards to hand them to the queue.
+    """
+    Book.objects.filter(pk=book_id).update(
+        available_copies=Least(F("available_copies") + count, F("total_copies"))
+    )
+
+
+def take_copies(book_id, wanted):
+    """
+    Takes up to `wanted` free copies of a book and returns how many were
+    taken. Each attempt is a conditional UPDATE, so concurrent checkouts and
+    promotions can never drive available_copies below zero.
+    """
+    while wanted > 0:
+        taken = Book.objects.filter(pk=book_id, available_copies__gte=wanted).update(
+            available_copies=F("available_copies") - wanted
+        )
+        if taken:
+            return wanted
+        # Someone took copies since we looked; retry with what is left
+        free = Book.objects.filter(pk=book_id).values_list(
+            "available_copies", flat=True
+        )
+        wanted = min(wanted, free.first() or 0)
+    return 0
+
+
+def promote_queue_heads(book_id):
+    """
+    Reserves a free copy for each of the longest-waiting ACTIVE queue entries
+    of a book, up to the number of copies on the shelf, and returns the
+    reserved entries.
+
+    Queue heads are claimed with SELECT ... FOR UPDATE OF <queue> SKIP
+    LOCKED, so workers promoting the same book in parallel claim disjoint
+    entries instead of blocking on (or double-reserving) each other, and
+    copies are taken with conditional F() updates rather than a
+    read-modify-write of the Book row. Only the queue rows are locked: the
+    joined user and book rows are not, or any transaction holding the book
+    row would make every head look taken.
+    """
+    with transaction.atomic():
+        free = (
+            Book.objects.filter(pk=book_id)
+            .values_list("available_copies", flat=True)
+            .first()
+        )
+        if not free:
+            return []
+
+        heads = list(
+            BookQueue.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(book_id=book_id, status=BookQueue.QueueStatus.ACTIVE)
+            .select_related("user", "book")
+            .order_by("created_at", "id")[:free]
+        )
+        heads = heads[: take_copies(book_id, len(heads))]
+        if not heads:
+            return []
+
+        expires_at = timezone.now() + timezone.timedelta(
+            hours=LibrarySettings.get_solo().reservation_expiry_hours
+        )
+        BookQueue.objects.filter(pk__in=[entry.pk for entry in heads]).update(
+            status=BookQueue.QueueStatus.RESERVED, expires_at=expires_at
+        )
+        decrement_counter(book_id, "active_queue_length", len(heads))
+        for entry in heads:
+            entry.status = BookQueue.QueueStatus.RESERVED
+            entry.expires_at = expires_at
+
+        transaction.on_commit(lambda: invalidate_book_cache(book_id))
+        if index.enabled():
+            user_ids = [entry.user_id for entry in heads]
+            transaction.on_commit(lambda: index.remove_entries(book_id, user_ids))
+    return heads
+
+
+def expire_reservations(now, batch_size=EXPIRY_BATCH_SIZE):
+    """
+    Marks every reservation that expired before `now` as EXPIRED and returns
+    their copies to the shelf, in batches of set-based UPDATEs (one
+    UPDATE ... RETURNING statement per batch on PostgreSQL). Returns a
+    Counter of released copies per book id.
+    """
+    released = Counter()
+    while True:
+        with transaction.atomic():
+            if is_postgres():
+                batch = _expire_batch_sql(now, batch_size)
+            else:
+                batch = _expire_batch_orm(now, batch_size)
+        for book_id in batch:
+            invalidate_book_cache(book_id)
+        released.update(batch)
+        if sum(batch.values()) < batch_size:
+            return released
+
+
+def _expire_batch_sql(now, batch_size):
+    sql = EXPIRE_RESERVATIONS_SQL.format(
+        queue=BookQueue._meta.db_table, book=Book._meta.db_table
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            {
+                "reserved": BookQueue.QueueStatus.RESERVED,
+                "expired": BookQueue.QueueStatus.EXPIRED,
+                "now": now,
+                "limit": batch_size,
+            },
+        )
+        return Counter(dict(cursor.fetchall()))
+
+
+def _expire_batch_orm(now, batch_size):
+    rows = list(
+        BookQueue.objects.select_for_update(skip_locked=True)
+        .filter(status=BookQueue.QueueStatus.RESERVED, expires_at__lt=now)
+        .order_by("id")
+        .values_list("id", "book_id")[:batch_size]
+    )
+    BookQueue.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+        status=BookQueue.QueueStatus.EXPIRED
+    )
+    batch = Counter(book_id for _, book_id in rows)
+    for book_id, copies in batch.items():
+        release_copies(book_id, copies)
+    return batch
@@ -1,8 +1,11 @@
+import math
+
 from rest_framework import serializers
 
 # Corrected Imports:
 from apps.books.models import Book
 
+from . import index
 from .models import BookQueue
 
 
@@ -14,7 +17,9 @@ class BookQueueSerializer(serializers.ModelSerializer):
     book_title = serializers.CharField(source="book.title", read_only=True)
     user_email = serializers.CharField(source="user.email", read_only=True)
 
-    position = serializers.SerializerMethodField()
+    # Annotated by QueueViewSet.get_queryset in the same query as the entry
+    position = serializers.IntegerField(read_only=True)
+    estimated_wait_days = serializers.SerializerMethodField()
 
     class Meta:
         model = BookQueue
@@ -27,21 +32,19 @@ class BookQueueSerializer(serializers.ModelSerializer):
             "status",
             "created_at",
             "position",
+            "estimated_wait_days",
         ]
 
-    def get_position(self, obj):
+    def get_estimated_wait_days(self, obj):
         """
-        Calculates the user's current position in the queue for a specific book.
+        Rough wait: the entries ahead are served one loan period per round,
+        one entry per copy each round.
         """
-        position = (
-            BookQueue.objects.filter(
-                book=obj.book,
-                status=BookQueue.QueueStatus.ACTIVE,
-                created_at__lt=obj.created_at,
-            ).count()
-            + 1
-        )
-        return position
+        loan_days = self.context.get("loan_duration_days")
+        if loan_days is None or obj.position is None:
+            return None
+        rounds = math.ceil(obj.position / max(obj.book.total_copies, 1))
+        return rounds * loan_days
 
 
 class JoinQueueSerializer(serializers.Serializer):
@@ -49,6 +52,11 @@ class JoinQueueSerializer(serializers.Serializer):
 
     def validate(self, data):
         user = self.context["request"].user
+        # Repeated joins are turned away by the Redis index without a query
+        if index.enabled() and index.is_queued(data["book_id"], user.pk):
+            raise serializers.ValidationError(
+                {"detail": "You are already in the active queue for this book."}
+            )
         try:
             book = Book.objects.get(pk=data["book_id"])
         except Book.DoesNotExist:
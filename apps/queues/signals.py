@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import index
+from .models import BookQueue
+
+
+@receiver(post_save, sender=BookQueue)
+def sync_queue_index(sender, instance, **kwargs):
+    """
+    Mirrors saved entries into the Redis queue index once committed.
+    Bulk .update() status changes sync the index themselves (promotion.py).
+    """
+    if index.enabled():
+        transaction.on_commit(lambda: index.sync_entry(instance))
+
+
+@receiver(post_delete, sender=BookQueue)
+def drop_from_queue_index(sender, instance, **kwargs):
+    if index.enabled():
+        transaction.on_commit(
+            lambda: index.remove_entries(instance.book_id, [instance.user_id])
+        )
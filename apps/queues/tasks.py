@@ -1,90 +1,111 @@
+import time
+
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 
 from apps.books.models import Book
-from apps.site_config.models import LibrarySettings
-from apps.users.tasks import send_verification_email_task
+from apps.users.tasks import email_message, queue_bulk_emails
 
-from .models import BookQueue
+from .promotion import expire_reservations, promote_queue_heads
 
+# Triggers for the same book arriving within this window share one promotion
+PROMOTION_DEBOUNCE_SECONDS = 5
 
-@shared_task
-def promote_next_in_queue(book_id):
+# Pending markers outlive a lost task by this much before a new one may start
+PROMOTION_PENDING_TIMEOUT = 60 * 5  # 5 minutes
+
+
+def promotion_pending_key(book_id):
+    return f"queues:promote:pending:{book_id}"
+
+
+def schedule_promotion(book_id):
     """
-    Promotes the next user in the queue for a given book.
-    This is called when a book is returned or a reservation expires.
+    Coalesces promotion triggers (returns, expiries) per book. The first
+    trigger marks the book as pending with an atomic SET NX and enqueues one
+    promote_next_in_queue, delayed by PROMOTION_DEBOUNCE_SECONDS; further
+    triggers for that book are no-ops until the task starts and clears the
+    marker. Returns whether a task was enqueued.
     """
+    key = promotion_pending_key(book_id)
+    if not cache.add(key, 1, PROMOTION_PENDING_TIMEOUT):
+        return False
     try:
-        book = Book.objects.get(id=book_id)
-        next_in_queue = (
-            BookQueue.objects.filter(book=book, status=BookQueue.QueueStatus.ACTIVE)
-            .order_by("created_at")
-            .first()
+        promote_next_in_queue.apply_async(
+            (book_id,), countdown=PROMOTION_DEBOUNCE_SECONDS
         )
+    except Exception:
+        cache.delete(key)
+        raise
+    return True
+
+
+@shared_task
+def promote_next_in_queue(book_id):
+    """
+    Reserves the book's free copies for the next users in its queue and
+    notifies them. Called when a copy is returned or a reservation expires;
+    safe to run concurrently for the same book (see promotion.py).
+    Enqueue it through schedule_promotion rather than directly.
+    """
+    # Cleared before promoting, so triggers from now on get a fresh run
+    cache.delete(promotion_pending_key(book_id))
 
-        if next_in_queue:
-            library_settings = LibrarySettings.get_solo()
-            user = next_in_queue.user
-            next_in_queue.status = BookQueue.QueueStatus.RESERVED
-            next_in_queue.expires_at = timezone.now() + timezone.timedelta(
-                hours=library_settings.reservation_expiry_hours
-            )
-            next_in_queue.save()
-
-            book.available_copies = 0
-            book.save()
-
-            subject = f"Your Reserved Book is Waiting: '{book.title}'"
-
-            book_detail_path = f"/books/{book.id}/"
-            full_cta_url = f"{settings.FRONTEND_BASE_URL}{book_detail_path}"
-
-            context = {
-                "email_title": "Your Reservation is Ready!",
-                "user_name": user.first_name,
-                "user_email": user.email,
-                "main_message": f"Great news! The book you were waiting for, '{book.title}', is now available. We have placed it on hold for you.",
-                "book_title": book.title,
-                "book_author": book.author,
-                "alert_message": "Please borrow the book within the next 24 hours. After this period, your reservation will expire and the book will be offered to the next person in the queue.",
-                "cta_url": full_cta_url,
-                "cta_text": "View Your Book & Borrow",
-            }
-
-            send_verification_email_task.delay(
-                subject, "emails/book_reservation_ready.html", context, [user.email]
-            )
-
-            return f"Reserved '{book.title}' and sent notification to {user.email}."
-
-        else:
-            book.available_copies = 1
-            book.save()
-            return f"No active queue for '{book.title}'. Made book available."
-
-    except Book.DoesNotExist:
+    if not Book.objects.filter(id=book_id).exists():
         return f"Book with id {book_id} not found."
 
+    reserved = promote_queue_heads(book_id)
+    if not reserved:
+        return f"No queue entries to promote for book {book_id}."
+
+    queue_bulk_emails([reservation_ready_email(entry) for entry in reserved])
+    emails = ", ".join(entry.user.email for entry in reserved)
+    return f"Reserved '{reserved[0].book.title}' and sent notification to {emails}."
+
+
+def reservation_ready_email(entry):
+    user, book = entry.user, entry.book
+    subject = f"Your Reserved Book is Waiting: '{book.title}'"
+
+    book_detail_path = f"/books/{book.id}/"
+    full_cta_url = f"{settings.FRONTEND_BASE_URL}{book_detail_path}"
+
+    context = {
+        "email_title": "Your Reservation is Ready!",
+        "user_name": user.first_name,
+        "user_email": user.email,
+        "main_message": f"Great news! The book you were waiting for, '{book.title}', is now available. We have placed it on hold for you.",
+        "book_title": book.title,
+        "book_author": book.author,
+        "alert_message": "Please borrow the book within the next 24 hours. After this period, your reservation will expire and the book will be offered to the next person in the queue.",
+        "cta_url": full_cta_url,
+        "cta_text": "View Your Book & Borrow",
+    }
+
+    return email_message(
+        subject, "emails/book_reservation_ready.html", context, [user.email]
+    )
+
 
 @shared_task
 def check_expired_queues():
     """
-    Finds and expires reservations that were not acted upon in time.
+    Finds and expires reservations that were not acted upon in time, then
+    schedules one promotion per book that got copies back.
     """
-    now = timezone.now()
-    expired_reservations = BookQueue.objects.filter(
-        expires_at__lt=now, status=BookQueue.QueueStatus.RESERVED
-    )
-
-    expired_count = 0
-    for reservation in expired_reservations:
-        reservation.status = BookQueue.QueueStatus.EXPIRED
-        reservation.save()
-        expired_count += 1
-        promote_next_in_queue.delay(reservation.book.id)
+    started = time.monotonic()
+    released = expire_reservations(timezone.now())
+    for book_id in released:
+        schedule_promotion(book_id)
 
+    expired_count = sum(released.values())
+    elapsed = time.monotonic() - started
     if expired_count > 0:
-        return f"Expired {expired_count} reservations and triggered promotions."
+        return (
+            f"Expired {expired_count} reservations across {len(released)} books "
+            f"in {elapsed:.3f}s and triggered promotions."
+        )
 
-    return "No reservations to expire."
+    return f"No reservations to expire (checked in {elapsed:.3f}s)."
@@ -1,9 +1,33 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
 from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
 
 from apps.books.models import Book
+from apps.queues import index
 from apps.queues.models import BookQueue
-from apps.queues.tasks import promote_next_in_queue
+from apps.site_config.models import LibrarySettings
+from apps.queues.promotion import (
+    expire_reservations,
+    promote_queue_heads,
+    release_copies,
+)
+from apps.queues.tasks import (
+    check_expired_queues,
+    promote_next_in_queue,
+    schedule_promotion,
+)
 from apps.users.models import User
 
 
@@ -31,6 +55,8 @@ class QueueLogicTests(TestCase):
         # User2 joins second.
         BookQueue.objects.create(book=self.book, user=self.user2)
 
+        # The only copy comes back
+        release_copies(self.book.id)
         promote_next_in_queue(self.book.id)
 
         q1 = BookQueue.objects.get(user=self.user1, book=self.book)
@@ -38,3 +64,334 @@ class QueueLogicTests(TestCase):
 
         self.assertEqual(q1.status, BookQueue.QueueStatus.RESERVED)
         self.assertEqual(q2.status, BookQueue.QueueStatus.ACTIVE)
+
+
+class MultiCopyPromotionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(
+            title="Popular Book",
+            author="Test Author",
+            isbn="9999999999998",
+            published_date=timezone.now().date(),
+            total_copies=3,
+            available_copies=0,
+        )
+        self.entries = [
+            BookQueue.objects.create(
+                book=self.book,
+                user=User.objects.create_user(email=f"user{i}@test.com", password="p"),
+            )
+            for i in range(4)
+        ]
+
+    def statuses(self):
+        return [
+            BookQueue.objects.get(pk=entry.pk).status for entry in self.entries
+        ]
+
+    def test_promotes_one_entry_per_free_copy(self):
+        release_copies(self.book.id, 2)
+        promote_next_in_queue(self.book.id)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(self.book.active_queue_length, 2)
+        self.assertEqual(
+            self.statuses(),
+            [BookQueue.QueueStatus.RESERVED] * 2 + [BookQueue.QueueStatus.ACTIVE] * 2,
+        )
+
+    def test_expired_reservation_passes_its_copy_on(self):
+        release_copies(self.book.id)
+        promote_next_in_queue(self.book.id)
+        BookQueue.objects.filter(pk=self.entries[0].pk).update(
+            expires_at=timezone.now() - timezone.timedelta(minutes=1)
+        )
+
+        check_expired_queues()
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(
+            self.statuses()[:3],
+            [
+                BookQueue.QueueStatus.EXPIRED,
+                BookQueue.QueueStatus.RESERVED,
+                BookQueue.QueueStatus.ACTIVE,
+            ],
+        )
+
+    def test_release_never_exceeds_total_copies(self):
+        release_copies(self.book.id, 2)
+        release_copies(self.book.id, 2)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, self.book.total_copies)
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ParallelPromotionTests(TransactionTestCase):
+    def test_parallel_promotions_never_over_reserve(self):
+        book = Book.objects.create(
+            title="Popular Book",
+            author="Test Author",
+            isbn="9999999999997",
+            published_date=timezone.now().date(),
+            total_copies=5,
+            available_copies=5,
+        )
+        for i in range(10):
+            BookQueue.objects.create(
+                book=book,
+                user=User.objects.create_user(email=f"user{i}@test.com", password="p"),
+            )
+        barrier = threading.Barrier(5)
+
+        def promote():
+            try:
+                barrier.wait()
+                promote_next_in_queue(book.id)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=promote) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        book.refresh_from_db()
+        reserved = BookQueue.objects.filter(
+            book=book, status=BookQueue.QueueStatus.RESERVED
+        )
+        self.assertEqual(reserved.count(), 5)
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(book.active_queue_length, 5)
+
+    def test_locked_book_row_does_not_hide_queue_heads(self):
+        """A transaction holding the book row delays the promotion, never skips it."""
+        book = Book.objects.create(
+            title="Popular Book",
+            author="Test Author",
+            isbn="9999999999996",
+            published_date=timezone.now().date(),
+            total_copies=1,
+            available_copies=1,
+        )
+        entry = BookQueue.objects.create(
+            book=book, user=User.objects.create_user(email="user@test.com", password="p")
+        )
+        locked = threading.Event()
+
+        def hold_book_row():
+            try:
+                with transaction.atomic():
+                    Book.objects.select_for_update().get(pk=book.pk)
+                    locked.set()
+                    time.sleep(0.3)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_book_row)
+        holder.start()
+        locked.wait()
+        reserved = promote_queue_heads(book.id)
+        holder.join()
+
+        self.assertEqual([head.pk for head in reserved], [entry.pk])
+
+
+class PromotionCoalescingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(
+            title="Popular Book",
+            author="Test Author",
+            isbn="9999999999996",
+            published_date=timezone.now().date(),
+            total_copies=2,
+            available_copies=0,
+        )
+
+    @mock.patch("apps.queues.tasks.promote_next_in_queue.apply_async")
+    def test_triggers_within_the_window_enqueue_one_task(self, apply_async):
+        results = [schedule_promotion(self.book.id) for _ in range(5)]
+
+        self.assertEqual(results, [True] + [False] * 4)
+        apply_async.assert_called_once()
+
+        # Once the task starts, new triggers schedule a fresh run
+        promote_next_in_queue(self.book.id)
+        self.assertTrue(schedule_promotion(self.book.id))
+
+    @mock.patch("apps.queues.tasks.promote_next_in_queue.apply_async")
+    def test_expiries_of_one_book_share_a_promotion(self, apply_async):
+        past = timezone.now() - timezone.timedelta(minutes=1)
+        for i in range(2):
+            BookQueue.objects.create(
+                book=self.book,
+                user=User.objects.create_user(email=f"user{i}@test.com", password="p"),
+                status=BookQueue.QueueStatus.RESERVED,
+                expires_at=past,
+            )
+
+        check_expired_queues()
+
+        apply_async.assert_called_once_with((self.book.id,), countdown=mock.ANY)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+    def test_expiry_sweep_runs_in_batches(self):
+        past = timezone.now() - timezone.timedelta(minutes=1)
+        for i in range(2):
+            BookQueue.objects.create(
+                book=self.book,
+                user=User.objects.create_user(email=f"user{i}@test.com", password="p"),
+                status=BookQueue.QueueStatus.RESERVED,
+                expires_at=past,
+            )
+
+        released = expire_reservations(timezone.now(), batch_size=1)
+
+        self.assertEqual(released, {self.book.id: 2})
+        self.assertFalse(
+            BookQueue.objects.filter(status=BookQueue.QueueStatus.RESERVED).exists()
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+
+class QueuePositionTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(email=f"user{i}@test.com", password="p")
+            for i in range(3)
+        ]
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Test Author",
+                isbn=f"99999999990{i}",
+                published_date=timezone.now().date(),
+                total_copies=2,
+                available_copies=0,
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[2])
+
+    def test_positions_are_ranked_in_one_query(self):
+        # users[2] is third in line for every book; users[0] left book 0
+        for book in self.books:
+            for user in self.users:
+                BookQueue.objects.create(book=book, user=user)
+        BookQueue.objects.filter(book=self.books[0], user=self.users[0]).update(
+            status=BookQueue.QueueStatus.EXPIRED
+        )
+
+        LibrarySettings.get_solo()  # Created on first use
+        # The page of entries, then the settings: no per-entry queries
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/queues/")
+
+        positions = {
+            entry["book"]: (entry["position"], entry["estimated_wait_days"])
+            for entry in response.data["results"]
+        }
+        self.assertEqual(
+            positions,
+            {
+                self.books[0].pk: (2, 14),
+                self.books[1].pk: (3, 28),
+                self.books[2].pk: (3, 28),
+            },
+        )
+
+
+@override_settings(QUEUE_INDEX_ENABLED=True)
+class QueueIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(
+            title="Popular Book",
+            author="Test Author",
+            isbn="9999999999995",
+            published_date=timezone.now().date(),
+            available_copies=0,
+        )
+        self.users = [
+            User.objects.create_user(email=f"user{i}@test.com", password="p")
+            for i in range(3)
+        ]
+
+    def join(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BookQueue.objects.create(book=self.book, user=user)
+
+    def indexed(self, book_id):
+        """
+        User ids in a book's sorted set, first in line first.
+        """
+        members = get_redis_connection("default").zrange(index.queue_key(book_id), 0, -1)
+        return [int(user_id) for user_id in members]
+
+    def test_index_follows_joins_and_promotions(self):
+        for user in self.users:
+            self.join(user)
+        self.assertEqual(self.indexed(self.book.id), [self.users[0].pk, self.users[1].pk, self.users[2].pk])
+
+        release_copies(self.book.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            promote_next_in_queue(self.book.id)
+
+        self.assertEqual(self.indexed(self.book.id), [self.users[1].pk, self.users[2].pk])
+
+    def test_positions_are_served_from_the_index(self):
+        for user in self.users:
+            self.join(user)
+        LibrarySettings.get_solo()
+        client = APIClient()
+        client.force_authenticate(self.users[1])
+
+        response = client.get("/api/queues/")
+
+        self.assertEqual(response.data["results"][0]["position"], 2)
+
+    def test_rebuild_restores_the_index(self):
+        for user in self.users:
+            self.join(user)
+        cache.clear()
+        self.assertEqual(self.indexed(self.book.id), [])
+
+        self.assertEqual(index.rebuild(), 3)
+        self.assertEqual(self.indexed(self.book.id), [self.users[0].pk, self.users[1].pk, self.users[2].pk])
+
+    def test_writes_during_a_rebuild_are_kept(self):
+        for user in self.users[:2]:
+            self.join(user)
+        other = Book.objects.create(
+            title="Another Book",
+            author="Test Author",
+            isbn="9999999999994",
+            published_date=timezone.now().date(),
+            available_copies=0,
+        )
+        snapshot = index.snapshot
+
+        def snapshot_then_write():
+            rows = list(snapshot())
+            # Committed (and mirrored) while the rebuild streams the snapshot
+            self.join(self.users[2])
+            with self.captureOnCommitCallbacks(execute=True):
+                BookQueue.objects.create(book=other, user=self.users[0])
+                BookQueue.objects.get(book=self.book, user=self.users[0]).delete()
+            return iter(rows)
+
+        with mock.patch.object(index, "snapshot", side_effect=snapshot_then_write):
+            self.assertEqual(index.rebuild(), 2)
+
+        self.assertEqual(self.indexed(self.book.id), [self.users[1].pk, self.users[2].pk])
+        self.assertEqual(self.indexed(other.pk), [self.users[0].pk])
+
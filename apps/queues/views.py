@@ -1,10 +1,36 @@
+from django.db.models.expressions import RawSQL
 from rest_framework import mixins, permissions, viewsets
 from rest_framework.response import Response
 
+from apps.books.counters import decrement_counter
+from apps.site_config.models import LibrarySettings
+
+from . import index
 from .models import BookQueue
 from .serializers import BookQueueSerializer
 
 
+def queue_position():
+    """
+    RANK() of an entry among the ACTIVE entries of its book, oldest first,
+    computed by a correlated subquery over the book's partition only.
+    """
+    table = BookQueue._meta.db_table
+    return RawSQL(
+        f"""
+        SELECT ranked.position FROM (
+            SELECT other.id, RANK() OVER (
+                PARTITION BY other.book_id ORDER BY other.created_at
+            ) AS position
+            FROM {table} AS other
+            WHERE other.status = %s AND other.book_id = {table}.book_id
+        ) AS ranked
+        WHERE ranked.id = {table}.id
+        """,
+        (BookQueue.QueueStatus.ACTIVE,),
+    )
+
+
 class QueueViewSet(
     mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
 ):
@@ -16,14 +42,31 @@ class QueueViewSet(
 
     serializer_class = BookQueueSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = "id"  # Oldest entry first, same as the queue itself
 
     def get_queryset(self):
         """
         Users can only see and manage their own queue entries.
+        Positions are annotated in the same query, not counted per entry,
+        unless the Redis queue index serves them (see paginate_queryset).
         """
-        return BookQueue.objects.filter(
+        queryset = BookQueue.objects.filter(
             user=self.request.user, status=BookQueue.QueueStatus.ACTIVE
-        ).select_related("book")
+        ).select_related("book", "user")
+        if not index.enabled():
+            queryset = queryset.annotate(position=queue_position())
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and index.enabled():
+            index.annotate_positions(page)
+        return page
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["loan_duration_days"] = LibrarySettings.get_solo().loan_duration_days
+        return context
 
     def perform_destroy(self, instance):
         """
@@ -32,3 +75,4 @@ class QueueViewSet(
         """
         instance.status = BookQueue.QueueStatus.EXPIRED
         instance.save()
+        decrement_counter(instance.book_id, "active_queue_length")
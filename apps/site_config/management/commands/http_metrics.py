@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from config.http import metrics
+
+
+class Command(BaseCommand):
+    """
+    Prints the outbound HTTP metrics recorded by config.http across all web
+    and Celery worker processes, one line per external host.
+    """
+
+    help = "Shows per-host outbound HTTP request, error and circuit metrics."
+
+    def handle(self, *args, **options):
+        hosts = metrics()
+        if not hosts:
+            self.stdout.write("No outbound HTTP calls recorded.")
+            return
+        for host, stats in hosts.items():
+            latency = stats["latency_ms_avg"]
+            self.stdout.write(
+                f"{host}: {stats['requests']} requests, {stats['errors']} errors, "
+                f"{stats['server_errors']} 5xx, "
+                f"{stats['short_circuited']} short-circuited, "
+                f"avg {'-' if latency is None else f'{latency:.0f}ms'}, "
+                f"circuit {stats['state']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(hosts)} hosts."))
@@ -0,0 +1,44 @@
+from celery import shared_task
+from django.apps import apps
+from django.core.files.storage import default_storage
+
+from .utils import post_image_to_imgbb
+
+# Retries of a failed ImgBB upload; the delay doubles each time from the base
+UPLOAD_MAX_RETRIES = 5
+UPLOAD_RETRY_BACKOFF = 30  # seconds
+
+
+@shared_task(bind=True, max_retries=UPLOAD_MAX_RETRIES)
+def upload_image_task(
+    self, model_label, pk, field, staged_name, extra_fields=None
+):
+    """
+    Pushes an image staged by stage_upload() to ImgBB and saves the URL into
+    `<model_label>.<field>` of the row `pk`, together with `extra_fields`,
+    retrying failed uploads with exponential backoff. The staged file is
+    removed once the upload succeeds or the retries run out.
+    """
+    try:
+        with default_storage.open(staged_name, "rb") as staged:
+            image_url = post_image_to_imgbb(staged.read())
+    except Exception as exc:
+        if self.request.retries < self.max_retries:
+            raise self.retry(
+                exc=exc, countdown=UPLOAD_RETRY_BACKOFF * 2**self.request.retries
+            )
+        default_storage.delete(staged_name)
+        print(f"CRITICAL ERROR: Giving up on ImgBB upload of {staged_name}: {exc}")
+        return f"Upload of {staged_name} failed: {exc}"
+
+    default_storage.delete(staged_name)
+    instance = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if instance is None:
+        return f"{model_label} {pk} no longer exists."
+    extra_fields = extra_fields or {}
+    setattr(instance, field, image_url)
+    for name, value in extra_fields.items():
+        setattr(instance, name, value)
+    # A targeted save, so post_save receivers (cache invalidation) still run
+    instance.save(update_fields=[field, *extra_fields])
+    return f"Uploaded {model_label} {pk} {field}: {image_url}"
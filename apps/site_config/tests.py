@@ -1,3 +1,115 @@
-from django.test import TestCase
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.test import SimpleTestCase
+from django_redis import get_redis_connection
+
+from config.http import CircuitBreaker, CircuitOpenError, HttpClient, metrics
+
+from .utils import post_image_to_imgbb
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /upload like ImgBB, /slow after a delay and /fail with 503.
+    """
+
+    def do_POST(self):
+        self.server.hits += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/slow":
+            time.sleep(0.5)
+        status = 503 if self.path == "/fail" else 200
+        body = b'{"data": {"url": "https://i.ibb.co/stub.png"}}'
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client timed out and hung up
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTests(SimpleTestCase):
+    def setUp(self):
+        get_redis_connection("default").flushall()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.hits = 0
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.host = f"127.0.0.1:{self.server.server_port}"
+        self.client = HttpClient(timeout=(1, 0.2), failure_threshold=2, cooldown=60)
+
+    def url(self, path):
+        return f"http://{self.host}{path}"
+
+    def test_read_timeout(self):
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.client.post(self.url("/slow"))
+
+        self.assertEqual(metrics()[self.host]["errors"], 1)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        for _ in range(2):
+            self.assertEqual(self.client.post(self.url("/fail")).status_code, 503)
+
+        with self.assertRaises(CircuitOpenError):
+            self.client.post(self.url("/upload"))
+
+        self.assertEqual(self.server.hits, 2)
+        stats = metrics()[self.host]
+        self.assertEqual(stats["server_errors"], 2)
+        self.assertEqual(stats["short_circuited"], 1)
+        self.assertEqual(stats["state"], CircuitBreaker.OPEN)
+
+    def test_circuit_closes_after_successful_trial(self):
+        self.client.cooldown = 0
+        for _ in range(2):
+            self.client.post(self.url("/fail"))
+        breaker = self.client.breaker(self.host)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        self.assertEqual(self.client.post(self.url("/upload")).status_code, 200)
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(metrics()[self.host]["requests"], 3)
+
+    def test_unexpected_error_in_trial_reopens_the_circuit(self):
+        self.client.cooldown = 0
+        for _ in range(2):
+            self.client.post(self.url("/fail"))
+        breaker = self.client.breaker(self.host)
+
+        with mock.patch.object(
+            self.client.session, "request", side_effect=ValueError("bad body")
+        ):
+            with self.assertRaises(ValueError):
+                self.client.post(self.url("/upload"))
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.client.post(self.url("/upload")).status_code, 200)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_imgbb_upload_goes_through_the_client(self):
+        with (
+            mock.patch.dict("os.environ", {"IMGBB_API_KEY": "key"}),
+            mock.patch("apps.site_config.utils.IMGBB_UPLOAD_URL", self.url("/upload")),
+            mock.patch("apps.site_config.utils.http_client", return_value=self.client),
+        ):
+            url = post_image_to_imgbb(b"image")
+            self.assertEqual(url, "https://i.ibb.co/stub.png")
+
+            self.client.cooldown = 60
+            for _ in range(2):
+                self.client.post(self.url("/fail"))
+            with self.assertRaises(CircuitOpenError):
+                post_image_to_imgbb(b"x")
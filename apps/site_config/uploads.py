@@ -0,0 +1,60 @@
+import os
+import uuid
+
+from celery import chain
+from django.core.files.storage import default_storage
+from django.db import transaction
+from rest_framework import status
+
+# Uploaded images wait here (under MEDIA_ROOT, shared with the workers) until
+# upload_image_task has pushed them to ImgBB
+UPLOAD_STAGING_DIR = "uploads/staging"
+
+
+def stage_upload(instance, field, image_file, prepare=(), extra_fields=None):
+    """
+    Saves an uploaded image to default storage and, once the transaction
+    commits, enqueues upload_image_task to push it to ImgBB and write the
+    URL into `instance.<field>`. The request never waits on ImgBB; the
+    instance is marked as having a pending upload for upload_pending().
+
+    `prepare` tasks are chained before the upload, each called with the
+    staged file name (e.g. to derive thumbnails from it); one that fails
+    stops the chain, so nothing is uploaded. `extra_fields` are saved along
+    with the URL, and only if the upload succeeds.
+
+    The worker reads the staged file back from default storage, so web and
+    workers must share it (the media volume in docker-compose.yml).
+    """
+    from .tasks import upload_image_task
+
+    extension = os.path.splitext(image_file.name or "")[1].lower()
+    staged_name = default_storage.save(
+        f"{UPLOAD_STAGING_DIR}/{uuid.uuid4().hex}{extension}", image_file
+    )
+    instance.__dict__.setdefault("pending_uploads", set()).add(field)
+
+    model_label, pk = instance._meta.label, instance.pk
+    steps = [task.si(staged_name) for task in prepare]
+    steps.append(
+        upload_image_task.si(model_label, pk, field, staged_name, extra_fields)
+    )
+    transaction.on_commit(lambda: chain(*steps).delay())
+    return staged_name
+
+
+def upload_pending(instance, field):
+    """
+    Whether `field` of `instance` was staged for upload in this request.
+    """
+    return field in instance.__dict__.get("pending_uploads", ())
+
+
+def accepted_if_pending(response, pending_field):
+    """
+    Turns a successful write response into 202 Accepted when its data says an
+    image upload is still pending.
+    """
+    if response.data.get(pending_field):
+        response.status_code = status.HTTP_202_ACCEPTED
+    return response
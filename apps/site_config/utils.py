@@ -2,14 +2,14 @@ import base64
 import os
 from datetime import timedelta
 
-import requests
-from django.db.models import Count, Q
 from django.utils import timezone
 
 from apps.books.models import Book
 from apps.loans.models import Loan
-from apps.queues.models import BookQueue
 from apps.users.models import User
+from config.http import http_client
+
+IMGBB_UPLOAD_URL = "https://api.imgbb.com/1/upload"
 
 
 def get_dashboard_context():
@@ -22,11 +22,7 @@ def get_dashboard_context():
     overdue_books = Loan.objects.filter(
         due_date__lt=timezone.now(), is_returned=False
     ).count()
-    books_with_queues = (
-        Book.objects.filter(queues__status=BookQueue.QueueStatus.ACTIVE)
-        .distinct()
-        .count()
-    )
+    books_with_queues = Book.objects.filter(active_queue_length__gt=0).count()
 
     # --- Widget Data ---
     recently_returned = (
@@ -37,15 +33,9 @@ def get_dashboard_context():
     most_overdue = Loan.objects.filter(
         is_returned=False, due_date__lt=timezone.now()
     ).order_by("due_date")[:5]
-    top_queued_books = (
-        Book.objects.annotate(
-            active_queue_count=Count(
-                "queues", filter=Q(queues__status=BookQueue.QueueStatus.ACTIVE)
-            )
-        )
-        .filter(active_queue_count__gt=0)
-        .order_by("-active_queue_count")[:5]
-    )
+    top_queued_books = Book.objects.filter(active_queue_length__gt=0).order_by(
+        "-active_queue_length"
+    )[:5]
 
     # --- Chart Data ---
     seven_days_ago = timezone.now() - timedelta(days=7)
@@ -77,34 +67,24 @@ def get_dashboard_context():
     }
 
 
-def upload_image_to_imgbb(image_file):
+def post_image_to_imgbb(image_bytes):
     """
-    Uploads an in-memory image file to ImgBB using a direct API call
-    and returns the display URL.
+    Uploads raw image bytes to ImgBB and returns the display URL. Raises on
+    a missing API key, network errors and error responses.
     """
     api_key = os.getenv("IMGBB_API_KEY")
     if not api_key:
-        print("CRITICAL ERROR: IMGBB_API_KEY is missing from environment variables.")
-        return None
+        raise RuntimeError("IMGBB_API_KEY is missing from environment variables.")
 
-    try:
-        image_bytes = image_file.read()
-        image_b64 = base64.b64encode(image_bytes).decode("utf-8")  # decode to str
+    image_b64 = base64.b64encode(image_bytes).decode("utf-8")  # decode to str
 
-        url = "https://api.imgbb.com/1/upload"
-        payload = {
-            "key": api_key,
-            "image": image_b64,
-        }
-
-        response = requests.post(url, data=payload)  # use data=payload
-        response.raise_for_status()
-        result = response.json()
-        return result["data"]["url"]
+    payload = {
+        "key": api_key,
+        "image": image_b64,
+    }
 
-    except requests.exceptions.RequestException as e:
-        print(f"CRITICAL ERROR: Network error during ImgBB upload: {e}")
-        return None
-    except Exception as e:
-        print(f"CRITICAL ERROR: Failed to upload image to ImgBB. Reason: {e}")
-        return None
+    # Pooled, with timeouts and a circuit breaker: an ImgBB outage fails fast
+    response = http_client().post(IMGBB_UPLOAD_URL, data=payload)
+    response.raise_for_status()
+    result = response.json()
+    return result["data"]["url"]
@@ -4,7 +4,6 @@ from django.utils import timezone
 
 from apps.books.models import Book
 from apps.loans.models import Loan
-from apps.queues.models import BookQueue
 from apps.users.models import User
 
 
@@ -16,11 +15,7 @@ def dashboard(request):
     overdue_books = Loan.objects.filter(
         is_returned=False, due_date__lt=timezone.now()
     ).count()
-    books_with_queues = (
-        Book.objects.filter(queues__status=BookQueue.QueueStatus.ACTIVE)
-        .distinct()
-        .count()
-    )
+    books_with_queues = Book.objects.filter(active_queue_length__gt=0).count()
 
     # Chart data (example: loans per day for last 7 days)
     last_7_days = [
@@ -30,15 +25,9 @@ def dashboard(request):
     chart_data = [Loan.objects.filter(loan_date__date=d).count() for d in last_7_days]
 
     # Top 5 queued books
-    top_queued_books = (
-        Book.objects.annotate(
-            active_queue_count=models.Count(
-                "queues", filter=models.Q(queues__status=BookQueue.QueueStatus.ACTIVE)
-            )
-        )
-        .filter(active_queue_count__gt=0)
-        .order_by("-active_queue_count")[:5]
-    )
+    top_queued_books = Book.objects.filter(active_queue_length__gt=0).order_by(
+        "-active_queue_length"
+    )[:5]
 
     # Most overdue loans
     most_overdue = Loan.objects.filter(
@@ -0,0 +1,66 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import auth_cache_key
+from .models import User
+
+# How long a resolved user is reused; saving or deleting the user drops the
+# entry right away (see apps.users.signals), so this only bounds how long
+# writes that bypass save() (queryset updates) can go unnoticed
+AUTH_USER_CACHE_TTL = 60
+
+
+def auth_fields():
+    """
+    Every column of the user except the password hash, which stays deferred
+    (and is loaded on access, e.g. by check_password).
+    """
+    return [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname != "password"
+    ]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from the cache instead
+    of querying the database on every request. The user's columns (role,
+    is_active, ...) are cached per user id for AUTH_USER_CACHE_TTL seconds and
+    hydrated into a User with Model.from_db, so permission checks and
+    request.user behave as with a freshly loaded user.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares the password hash, which is never cached
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                "Token contained no recognizable user identification"
+            ) from e
+
+        key = auth_cache_key(user_id)
+        values = cache.get(key)
+        if values is None:
+            fields = auth_fields()
+            row = (
+                User.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+                .values_list(*fields)
+                .first()
+            )
+            if row is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            values = dict(zip(fields, row))
+            cache.set(key, values, AUTH_USER_CACHE_TTL)
+
+        user = User.from_db(DEFAULT_DB_ALIAS, list(values), list(values.values()))
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
@@ -0,0 +1,32 @@
+from django.core.cache import cache
+
+from apps.academic.cache import DEPARTMENTS_NAMESPACE
+from config.cache import bump_generation, get_generation
+
+
+def user_namespace(user_id):
+    return f"users:{user_id}"
+
+
+def profile_etag(user):
+    """
+    Version tag of a user's profile: the user's own generation, bumped on
+    every save, plus the departments generation for the department name.
+    """
+    return '"user-%s-%s-%s"' % (
+        user.pk,
+        get_generation(user_namespace(user.pk)),
+        get_generation(DEPARTMENTS_NAMESPACE),
+    )
+
+
+def auth_cache_key(user_id):
+    """
+    Cached columns of a user for CachedJWTAuthentication.
+    """
+    return f"{user_namespace(user_id)}:auth"
+
+
+def invalidate_user(user_id):
+    bump_generation(user_namespace(user_id))
+    cache.delete(auth_cache_key(user_id))
@@ -0,0 +1,88 @@
+import functools
+import re
+
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.utils.html import escape, strip_tags
+
+# Stands in for the per-message context values while a batch's shared shell
+# is rendered; only letters and digits, so escaping leaves it untouched
+FIELD_TOKEN = "METROREADSFIELD{}X"
+FIELD_TOKEN_RE = re.compile(r"METROREADSFIELD(\d+)X")
+
+
+@functools.lru_cache(maxsize=None)
+def email_templates(template_name):
+    """
+    The compiled HTML template and its plaintext sibling (the same name with
+    a .txt extension, or None if there is none), compiled once and kept for
+    the life of the worker process.
+    """
+    html_template = get_template(template_name)
+    try:
+        text_template = get_template(f"{template_name.rsplit('.', 1)[0]}.txt")
+    except TemplateDoesNotExist:
+        text_template = None
+    return html_template, text_template
+
+
+def render_email(template_name, context):
+    """
+    Renders one message; returns its (plain text, HTML) bodies. The plain
+    text comes from the .txt template, falling back to stripping the HTML.
+    """
+    html_template, text_template = email_templates(template_name)
+    html = html_template.render(context)
+    if text_template is None:
+        return strip_tags(html), html
+    return text_template.render(context), html
+
+
+def _substitute(shell, values, html):
+    return FIELD_TOKEN_RE.sub(
+        lambda match: (escape if html else str)(values[int(match[1])]), shell
+    )
+
+
+def render_emails(template_name, contexts):
+    """
+    Renders a batch of messages of one template; returns a list of (plain
+    text, HTML) pairs. The template is rendered once, with a token in place
+    of every context value that differs between messages, and each message
+    is that shell with its own values substituted (escaped in the HTML).
+
+    This relies on the per-message values being printed with plain
+    {{ variable }} tags. Values a template could branch or loop on (anything
+    but non-empty strings) make the batch fall back to full renders.
+    """
+    if len(contexts) < 2:
+        return [render_email(template_name, context) for context in contexts]
+
+    keys = set().union(*contexts)
+    varying = sorted(
+        key
+        for key in keys
+        if any(context.get(key) != contexts[0].get(key) for context in contexts)
+    )
+    if not all(
+        isinstance(context.get(key), str) and context.get(key)
+        for context in contexts
+        for key in varying
+    ):
+        return [render_email(template_name, context) for context in contexts]
+
+    shell_context = {
+        **contexts[0],
+        **{key: FIELD_TOKEN.format(i) for i, key in enumerate(varying)},
+    }
+    text_shell, html_shell = render_email(template_name, shell_context)
+    rendered = []
+    for context in contexts:
+        values = [context[key] for key in varying]
+        rendered.append(
+            (
+                _substitute(text_shell, values, html=False),
+                _substitute(html_shell, values, html=True),
+            )
+        )
+    return rendered
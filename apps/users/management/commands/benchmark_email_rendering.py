@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from apps.users.emails import render_emails
+
+
+class Command(BaseCommand):
+    """
+    Compares the throughput of rendering a batch of notification emails the
+    old way (render_to_string + strip_tags per message) and through
+    render_emails (one shell render per batch, .txt plaintext).
+    Nothing is sent.
+    """
+
+    help = "Benchmarks per-message vs batched email template rendering."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--messages", type=int, default=1000, help="Messages per batch."
+        )
+        parser.add_argument(
+            "--template",
+            default="emails/due_date_reminder.html",
+            help="Email template to render.",
+        )
+
+    def handle(self, *args, **options):
+        template_name = options["template"]
+        contexts = [
+            {
+                "email_title": "Due Date Reminder",
+                "user_name": f"Member {i}",
+                "user_email": f"member{i}@example.com",
+                "book_title": f"Book {i}",
+                "due_date": "Monday, January 05, 2026",
+                "cta_url": "https://example.com/loans/",
+                "cta_text": "View Your Loans",
+            }
+            for i in range(options["messages"])
+        ]
+
+        def per_message():
+            for context in contexts:
+                html = render_to_string(template_name, context)
+                strip_tags(html)
+
+        def batched():
+            render_emails(template_name, contexts)
+
+        # Warm both paths up so template loading is not measured
+        render_to_string(template_name, contexts[0])
+        render_emails(template_name, contexts[:2])
+
+        timings = {}
+        for name, run in (("per-message", per_message), ("batched", batched)):
+            started = time.perf_counter()
+            run()
+            timings[name] = time.perf_counter() - started
+            self.stdout.write(
+                f"{name:>12}: {timings[name]:.3f}s "
+                f"({len(contexts) / timings[name]:.0f} messages/s)"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Batched rendering is "
+                f"{timings['per-message'] / timings['batched']:.1f}x faster."
+            )
+        )
@@ -3,7 +3,7 @@ from rest_framework import serializers
 from apps.academic.models import Department
 
 from .models import User
-from apps.site_config.utils import upload_image_to_imgbb
+from apps.site_config.uploads import stage_upload, upload_pending
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -14,6 +14,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     # CORRECTED: Use a distinct name for the upload field
     upload_profile_picture = serializers.ImageField(write_only=True, required=False)
+    profile_picture_pending = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -33,6 +34,7 @@ class UserSerializer(serializers.ModelSerializer):
             "address",
             "account_status",
             "upload_profile_picture",
+            "profile_picture_pending",
         ]
         read_only_fields = ["profile_picture"]
 
@@ -43,14 +45,15 @@ class UserSerializer(serializers.ModelSerializer):
             else None
         )
 
+    def get_profile_picture_pending(self, obj):
+        return upload_pending(obj, "profile_picture")
+
     def update(self, instance, validated_data):
         image_file = validated_data.pop("upload_profile_picture", None)
         user = super().update(instance, validated_data)
         if image_file:
-            imgbb_url = upload_image_to_imgbb(image_file)
-            if imgbb_url:
-                user.profile_picture = imgbb_url
-                user.save()
+            # Pushed to ImgBB by a Celery task; profile_picture is set when done
+            stage_upload(user, "profile_picture", image_file)
         return user
 
 
@@ -93,8 +96,6 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             **validated_data
         )
         if image_file:
-            imgbb_url = upload_image_to_imgbb(image_file)
-            if imgbb_url:
-                user.profile_picture = imgbb_url
-                user.save()
+            # Pushed to ImgBB by a Celery task; profile_picture is set when done
+            stage_upload(user, "profile_picture", image_file)
         return user
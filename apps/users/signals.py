@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_user
+from .models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    """
+    Drops the user's cached entries once the change is committed; dropping
+    them earlier would let a concurrent request cache the old row again.
+    """
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user(user_id))
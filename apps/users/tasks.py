@@ -1,15 +1,19 @@
 from celery import shared_task
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import EmailValidator
 
-from .utils import send_metro_reads_email
+from .utils import send_metro_reads_email, send_metro_reads_emails
 
+# Retries of a bulk email batch; the delay doubles each time from the base
+BULK_EMAIL_MAX_RETRIES = 3
+BULK_EMAIL_RETRY_BACKOFF = 30  # seconds
 
-@shared_task
-def send_verification_email_task(subject, template_name, context, recipient_list):
+
+def clean_recipients(recipient_list):
     """
-    Celery task to send a templated email with basic recipient validation.
-    Invalid addresses are skipped to prevent SMTP 553 errors.
+    Drops invalid addresses (to prevent SMTP 553 errors) and duplicates,
+    preserving order.
     """
     validator = EmailValidator()
 
@@ -28,6 +32,16 @@ def send_verification_email_task(subject, template_name, context, recipient_list
         if r not in seen:
             valid_recipients_deduped.append(r)
             seen.add(r)
+    return valid_recipients_deduped
+
+
+@shared_task
+def send_verification_email_task(subject, template_name, context, recipient_list):
+    """
+    Celery task to send a templated email with basic recipient validation.
+    Invalid addresses are skipped to prevent SMTP 553 errors.
+    """
+    valid_recipients_deduped = clean_recipients(recipient_list)
 
     if not valid_recipients_deduped:
         print("No valid recipients after validation; email not sent.")
@@ -36,3 +50,58 @@ def send_verification_email_task(subject, template_name, context, recipient_list
     return send_metro_reads_email(
         subject, template_name, context, valid_recipients_deduped
     )
+
+
+def email_message(subject, template_name, context, recipient_list):
+    """
+    One entry of a send_bulk_email_task batch.
+    """
+    return {
+        "subject": subject,
+        "template_name": template_name,
+        "context": context,
+        "to": recipient_list,
+    }
+
+
+def queue_bulk_emails(messages):
+    """
+    Enqueues messages built with email_message() in batches of
+    EMAIL_BATCH_SIZE, one send_bulk_email_task per batch.
+    """
+    size = settings.EMAIL_BATCH_SIZE
+    for start in range(0, len(messages), size):
+        send_bulk_email_task.delay(messages[start : start + size])
+
+
+@shared_task(bind=True, max_retries=BULK_EMAIL_MAX_RETRIES)
+def send_bulk_email_task(self, messages):
+    """
+    Sends a batch of templated emails over one SMTP connection.
+    Messages that fail are retried on their own, with exponential backoff;
+    the result lists those that still failed after the last retry.
+    """
+    messages = [
+        {**message, "to": clean_recipients(message["to"])} for message in messages
+    ]
+    messages = [message for message in messages if message["to"]]
+    countdown = BULK_EMAIL_RETRY_BACKOFF * 2**self.request.retries
+
+    try:
+        sent, failed = send_metro_reads_emails(messages)
+    except Exception as exc:
+        # The connection itself could not be opened: retry the whole batch
+        raise self.retry(exc=exc, countdown=countdown)
+
+    if failed and self.request.retries < self.max_retries:
+        print(f"Sent {sent} emails; retrying {len(failed)} failed ones.")
+        raise self.retry(
+            args=([message for message, _ in failed],), countdown=countdown
+        )
+
+    return {
+        "sent": sent,
+        "failed": [
+            {"to": message["to"], "error": error} for message, error in failed
+        ],
+    }
@@ -1,3 +1,278 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import CachedJWTAuthentication
+from .emails import email_templates, render_email, render_emails
+from .models import User
+from .tasks import email_message, queue_bulk_emails, send_bulk_email_task
+
+
+def reminder(address):
+    return email_message(
+        "Reminder",
+        "emails/due_date_reminder.html",
+        {"user_name": "Member", "book_title": "Test Book"},
+        [address],
+    )
+
+
+@override_settings(EMAIL_RATE_LIMIT=0, EMAIL_BATCH_SIZE=2)
+class BulkEmailTests(TestCase):
+    def test_batch_is_sent_over_one_connection(self):
+        with mock.patch(
+            "apps.users.utils.get_connection", wraps=mail.get_connection
+        ) as get_connection:
+            result = send_bulk_email_task.apply(
+                ([reminder(f"member{i}@test.com") for i in range(3)],)
+            ).get()
+
+        self.assertEqual(result, {"sent": 3, "failed": []})
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0].mimetype, "text/html")
+
+    def test_invalid_recipients_are_skipped(self):
+        result = send_bulk_email_task.apply(
+            ([reminder("not-an-email"), reminder("member@test.com")],)
+        ).get()
+
+        self.assertEqual(result["sent"], 1)
+        self.assertEqual(mail.outbox[0].to, ["member@test.com"])
+
+    def test_only_failed_messages_are_retried(self):
+        attempts = []
+        send = EmailBackend.send_messages
+
+        def flaky_send(backend, messages):
+            attempts.extend(message.to[0] for message in messages)
+            if messages[0].to == ["flaky@test.com"] and attempts.count(
+                "flaky@test.com"
+            ) < 3:
+                raise ConnectionResetError("connection reset")
+            return send(backend, messages)
+
+        with mock.patch.object(EmailBackend, "send_messages", flaky_send):
+            result = send_bulk_email_task.apply(
+                ([reminder("member@test.com"), reminder("flaky@test.com")],)
+            ).get()
+
+        self.assertEqual(result, {"sent": 1, "failed": []})
+        self.assertEqual(attempts.count("member@test.com"), 1)
+        self.assertEqual(attempts.count("flaky@test.com"), 3)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_messages_that_keep_failing_are_reported(self):
+        with mock.patch.object(
+            EmailBackend, "send_messages", side_effect=ConnectionResetError("down")
+        ):
+            result = send_bulk_email_task.apply(([reminder("member@test.com")],)).get()
+
+        self.assertEqual(
+            result,
+            {"sent": 0, "failed": [{"to": ["member@test.com"], "error": "down"}]},
+        )
+
+    def test_messages_are_enqueued_in_batches(self):
+        with mock.patch.object(send_bulk_email_task, "delay") as delay:
+            queue_bulk_emails([reminder(f"member{i}@test.com") for i in range(5)])
+
+        batches = [len(call.args[0]) for call in delay.call_args_list]
+        self.assertEqual(batches, [2, 2, 1])
+
+
+class EmailRenderingTests(TestCase):
+    def contexts(self):
+        return [
+            {
+                "email_title": "Due Date Reminder",
+                "user_name": name,
+                "user_email": f"member{i}@test.com",
+                "book_title": title,
+                "due_date": "Monday, January 05, 2026",
+                "cta_url": "https://example.com/loans/",
+                "cta_text": "View Your Loans",
+            }
+            for i, (name, title) in enumerate(
+                [("Ada", "Dune"), ("Bob", "Tom & Jerry <Vol. 1>"), ("Cy", "Emma")]
+            )
+        ]
+
+    def test_batch_matches_per_message_renders(self):
+        contexts = self.contexts()
+        batch = render_emails("emails/due_date_reminder.html", contexts)
+
+        self.assertEqual(
+            batch,
+            [render_email("emails/due_date_reminder.html", c) for c in contexts],
+        )
+        text, html = batch[1]
+        self.assertIn("Tom &amp; Jerry &lt;Vol. 1&gt;", html)
+        self.assertIn("Title: Tom & Jerry <Vol. 1>", text)
+        self.assertNotIn("<", text.replace("<Vol. 1>", ""))
+
+    def test_shell_is_rendered_once_per_batch(self):
+        html_template, text_template = email_templates("emails/due_date_reminder.html")
+        with mock.patch.object(
+            html_template, "render", wraps=html_template.render
+        ) as render:
+            render_emails("emails/due_date_reminder.html", self.contexts())
+
+        self.assertEqual(render.call_count, 1)
+
+    def test_non_string_values_are_rendered_in_full(self):
+        contexts = [
+            {"user_name": "Ada", "due_loans": [{"book_title": "Dune"}], "fines": []},
+            {"user_name": "Bob", "due_loans": [], "fines": []},
+        ]
+        batch = render_emails("emails/daily_digest.html", contexts)
+
+        self.assertIn("Due Tomorrow (1)", batch[0][1])
+        self.assertNotIn("Due Tomorrow", batch[1][1])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="librarian@test.com",
+            password="p",
+            role=User.Role.LIBRARIAN,
+            is_active=True,
+        )
+        self.token = AccessToken.for_user(self.user)
+        self.authentication = CachedJWTAuthentication()
+
+    def test_user_is_resolved_from_the_cache(self):
+        self.authentication.get_user(self.token)
+
+        with self.assertNumQueries(0):
+            user = self.authentication.get_user(self.token)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.role, User.Role.LIBRARIAN)
+        self.assertEqual(user.get_deferred_fields(), {"password"})
+
+    def test_saving_the_user_drops_the_cached_entry(self):
+        self.authentication.get_user(self.token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = User.Role.MEMBER
+            self.user.save()
+        self.assertEqual(
+            self.authentication.get_user(self.token).role, User.Role.MEMBER
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.get_user(self.token)
+
+    def test_permission_checks_use_the_cached_role(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        self.assertEqual(client.get("/api/users/manage/").status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = User.Role.MEMBER
+            self.user.save()
+
+        self.assertEqual(client.get("/api/users/manage/").status_code, 403)
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs concurrent transactions")
+class CachedJWTInvalidationTests(TransactionTestCase):
+    def test_request_during_the_save_does_not_recache_the_old_row(self):
+        user = User.objects.create_user(
+            email="librarian@test.com",
+            password="p",
+            role=User.Role.LIBRARIAN,
+            is_active=True,
+        )
+        token = AccessToken.for_user(user)
+        authentication = CachedJWTAuthentication()
+        saved, checked = threading.Event(), threading.Event()
+
+        def demote():
+            try:
+                with transaction.atomic():
+                    user.role = User.Role.MEMBER
+                    user.save()
+                    saved.set()
+                    checked.wait(5)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=demote)
+        writer.start()
+        try:
+            self.assertTrue(saved.wait(5))
+            # Authenticates before the commit, caching the committed row
+            role = authentication.get_user(token).role
+        finally:
+            checked.set()
+            writer.join()
+
+        self.assertEqual(role, User.Role.LIBRARIAN)
+        self.assertEqual(authentication.get_user(token).role, User.Role.MEMBER)
+
+
+@override_settings(EMAIL_VERIFICATION_ENABLED=False)
+class RegistrationTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def register(self, **extra):
+        return APIClient().post(
+            "/api/users/register/",
+            {
+                "email": "member@test.com",
+                "password": "secret-pass-1",
+                "first_name": "Ada",
+                "last_name": "Lovelace",
+                **extra,
+            },
+            format="multipart",
+        )
+
+    def test_registration_without_a_picture_is_created(self):
+        response = self.register()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.data["profile_picture_pending"])
+
+    @mock.patch(
+        "apps.site_config.tasks.post_image_to_imgbb",
+        return_value="https://i.ibb.co/me.png",
+    )
+    def test_registration_with_a_picture_is_accepted(self, post_image):
+        buffer = BytesIO()
+        Image.new("RGB", (4, 4), "red").save(buffer, format="PNG")
+        picture = SimpleUploadedFile("me.png", buffer.getvalue(), "image/png")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.register(upload_profile_picture=picture)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.data["profile_picture_pending"])
+        self.assertEqual(
+            User.objects.get().profile_picture, "https://i.ibb.co/me.png"
+        )
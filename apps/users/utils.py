@@ -1,10 +1,9 @@
-import os
+import time
 
-import requests
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
+
+from .emails import render_email, render_emails
 
 
 def send_metro_reads_email(subject, template_name, context, recipient_list):
@@ -18,11 +17,9 @@ def send_metro_reads_email(subject, template_name, context, recipient_list):
         recipient_list (list): A list of recipient email addresses.
     """
     try:
-        # Render the HTML content from the template
-        html_message = render_to_string(template_name, context)
-
-        # Create a plain text version of the email for clients that don't render HTML
-        plain_message = strip_tags(html_message)
+        # Render the HTML content and its plain text version for clients
+        # that don't render HTML
+        plain_message, html_message = render_email(template_name, context)
 
         send_mail(
             subject=subject,
@@ -40,19 +37,72 @@ def send_metro_reads_email(subject, template_name, context, recipient_list):
         return False
 
 
-def upload_image_to_imgbb(image_file):
+def build_metro_reads_email(subject, plain_message, html_message, recipient_list):
     """
-    Uploads an image file to imgbb and returns the image URL.
+    Wraps rendered bodies into a message object, without sending it.
     """
-    imgbb_api_key = os.getenv("IMGBB_API_KEY")
-    url = "https://api.imgbb.com/1/upload"
-    payload = {
-        "key": imgbb_api_key,
-        "image": image_file.read(),
-    }
-    response = requests.post(
-        url, files={"image": image_file}, data={"key": imgbb_api_key}
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_message,
+        from_email=f"Metro Reads <{settings.EMAIL_HOST_USER}>",
+        to=recipient_list,
     )
-    response.raise_for_status()
-    data = response.json()
-    return data["data"]["url"]
+    message.attach_alternative(html_message, "text/html")
+    return message
+
+
+def render_batch(messages):
+    """
+    (plain text, HTML) bodies of every message, rendered per template with
+    render_emails; None for messages of a template whose batch render failed,
+    so the failure is reported against each of them when sent.
+    """
+    by_template = {}
+    for i, message in enumerate(messages):
+        by_template.setdefault(message["template_name"], []).append(i)
+
+    bodies = [None] * len(messages)
+    for template_name, indexes in by_template.items():
+        try:
+            rendered = render_emails(
+                template_name, [messages[i]["context"] for i in indexes]
+            )
+        except Exception as e:
+            print(f"Error rendering {template_name}: {e}")
+            continue
+        for i, pair in zip(indexes, rendered):
+            bodies[i] = pair
+    return bodies
+
+
+def send_metro_reads_emails(messages):
+    """
+    Sends many templated emails over a single SMTP connection.
+
+    `messages` is a list of {"subject", "template_name", "context", "to"}
+    dicts, rendered per template in one pass (see apps.users.emails). Each
+    message is sent on its own over the shared connection, so one rejected
+    recipient does not fail the rest, and sending is paced to at most
+    EMAIL_RATE_LIMIT messages per second (0 disables the cap).
+    Returns (sent count, list of (message, error) for the failures).
+    """
+    interval = 1 / settings.EMAIL_RATE_LIMIT if settings.EMAIL_RATE_LIMIT else 0
+    sent, failed = 0, []
+    bodies = render_batch(messages)
+    next_send = time.monotonic()
+    with get_connection(fail_silently=False) as connection:
+        for message, body in zip(messages, bodies):
+            time.sleep(max(0, next_send - time.monotonic()))
+            next_send = time.monotonic() + interval
+            try:
+                if body is None:
+                    body = render_email(message["template_name"], message["context"])
+                email = build_metro_reads_email(
+                    message["subject"], *body, message["to"]
+                )
+                connection.send_messages([email])
+                sent += 1
+            except Exception as e:
+                print(f"Error sending email to {message['to']}: {e}")
+                failed.append((message, str(e)))
+    return sent, failed
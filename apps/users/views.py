@@ -10,7 +10,10 @@ from rest_framework.views import APIView
 
 from apps.cards.models import LibraryCard
 from apps.cards.tasks import generate_library_card_pdf_task
+from apps.site_config.uploads import accepted_if_pending, upload_pending
+from config.cache import conditional_get
 
+from .cache import profile_etag
 from .models import User
 from .permissions import IsAdminOrLibrarian
 from .serializers import UserRegistrationSerializer, UserSerializer
@@ -60,10 +63,18 @@ class UserRegistrationView(generics.CreateAPIView):
             user.save(update_fields=["is_active", "is_verified"])
             verification_detail = "Registration successful. Your account is active."
 
-        response_data = {"user_data": serializer.data, "detail": verification_detail}
+        response_data = {
+            "user_data": serializer.data,
+            "detail": verification_detail,
+            "profile_picture_pending": upload_pending(user, "profile_picture"),
+        }
 
         headers = self.get_success_headers(serializer.data)
-        return Response(response_data, status=status.HTTP_201_CREATED, headers=headers)
+        response = Response(
+            response_data, status=status.HTTP_201_CREATED, headers=headers
+        )
+        # 202 while an uploaded picture is still on its way to ImgBB
+        return accepted_if_pending(response, "profile_picture_pending")
 
 
 class UserVerificationView(APIView):
@@ -107,10 +118,23 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_get(etag="get_etag")
+    def get(self, request, *args, **kwargs):
+        # Unchanged profiles are answered with a 304 without serializing
+        return super().get(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        # 202 while an uploaded picture is still on its way to ImgBB
+        response = super().update(request, *args, **kwargs)
+        return accepted_if_pending(response, "profile_picture_pending")
+
     def get_object(self):
         # Returns the user associated with the request
         return self.request.user
 
+    def get_etag(self, request, *args, **kwargs):
+        return profile_etag(request.user)
+
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     """
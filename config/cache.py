@@ -0,0 +1,256 @@
+import hashlib
+import json
+import logging
+import time
+from functools import wraps
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIRequest
+from django.utils.http import parse_etags
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Single-flight tuning (in seconds)
+SINGLE_FLIGHT_LOCK_TIMEOUT = 10  # Lock auto-expires if its holder dies
+SINGLE_FLIGHT_WAIT = 2  # How long other workers wait for the holder's result
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+
+def generation_key(namespace):
+    return f"{namespace}:generation"
+
+
+def get_generation(namespace):
+    """
+    Returns the current generation number of a cache namespace.
+
+    A missing counter (first use, or evicted) is seeded from the clock in
+    milliseconds rather than 1, so it lands above any generation that older,
+    still-unexpired entries could have been written under.
+    """
+    key = generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(namespace):
+    """
+    Invalidates every key of a namespace with a single INCR.
+    Entries written under older generations are never read again and simply
+    expire with their TTL.
+    """
+    try:
+        return cache.incr(generation_key(namespace))
+    except ValueError:
+        # No counter yet: seeding one is already a new generation.
+        return get_generation(namespace)
+
+
+def versioned_key(namespace, *parts):
+    """
+    Builds a cache key scoped to the namespace's current generation,
+    e.g. versioned_key("books:list", params_hash) -> "books:list:g17:<hash>".
+    """
+    suffix = ":".join(str(part) for part in parts)
+    return f"{namespace}:g{get_generation(namespace)}:{suffix}"
+
+
+def single_flight(key, compute, timeout):
+    """
+    Returns the cached value for `key`, recomputing it at most once across
+    workers on a miss.
+
+    The first worker to miss takes a short lock (an atomic SET NX on
+    "<key>:lock") and runs `compute()`; the others poll the cache for its
+    result for up to SINGLE_FLIGHT_WAIT seconds, and only compute it
+    themselves if the holder has not delivered by then. `compute()` may return
+    None for results that must not be cached.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, SINGLE_FLIGHT_LOCK_TIMEOUT):
+        try:
+            value = compute()
+            if value is not None:
+                cache.set(key, value, timeout)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return compute()
+
+
+def cached_response(key, build, timeout, stale_timeout=0):
+    """
+    Serves a viewset action's data from the cache, with single-flight
+    recomputation. `key` is the name of a view method, or a callable, taking
+    (request, *args, **kwargs) and returning the cache key. `build` is the
+    dotted path of a plain function taking the Django HttpRequest and the
+    view's URL kwargs and returning the data (or raising Http404); it is what
+    computes the data on a miss, so the decorated action's body never runs.
+
+    Entries are fresh for `timeout` seconds. With a `stale_timeout`, they are
+    then served stale for up to that many more seconds while a Celery task
+    calls `build` again in the background (stale-while-revalidate); only
+    after that hard expiry does a request pay for the recomputation itself.
+    Keys must change when the data is invalidated (see versioned_key): the
+    refresh then writes a payload rendered before an invalidation under the
+    old key, where nobody reads it.
+
+    Responses carry the entry's ETag, and requests whose If-None-Match
+    matches it get a 304 straight from the cache.
+
+        @cached_response(
+            key="get_detail_cache_key",
+            build="apps.books.payloads.book_detail_payload",
+            timeout=60,
+            stale_timeout=300,
+        )
+        def retrieve(self, request, *args, **kwargs):
+            ...
+    """
+
+    def decorator(action):
+        @wraps(action)
+        def wrapper(view, request, *args, **kwargs):
+            key_func = getattr(view, key) if isinstance(key, str) else key
+            cache_key = key_func(request, *args, **kwargs)
+
+            entry = cache.get(cache_key)
+            if entry is None:
+                entry = single_flight(
+                    cache_key,
+                    lambda: make_entry(
+                        import_string(build)(request._request, **kwargs), timeout
+                    ),
+                    timeout + stale_timeout,
+                )
+            elif entry["fresh_until"] <= time.time():
+                schedule_refresh(
+                    build, request, kwargs, cache_key, timeout, stale_timeout
+                )
+
+            if etag_matches(request, entry["etag"]):
+                return not_modified(entry["etag"])
+            return Response(entry["data"], headers={"ETag": entry["etag"]})
+
+        return wrapper
+
+    return decorator
+
+
+def make_entry(data, timeout):
+    """
+    Wraps cached response data with its soft expiry time and a strong ETag,
+    computed once here so cache hits never need to re-render the payload.
+    """
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+    etag = '"%s"' % hashlib.md5(payload.encode("utf-8")).hexdigest()
+    return {"data": data, "etag": etag, "fresh_until": time.time() + timeout}
+
+
+def etag_matches(request, etag):
+    """
+    Whether the request's If-None-Match header covers `etag`. Uses the weak
+    comparison RFC 9110 prescribes for If-None-Match, since proxies that
+    compress responses (e.g. nginx gzip) weaken the ETags they pass through.
+    """
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    candidates = {tag.removeprefix("W/") for tag in parse_etags(header)}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def not_modified(etag):
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def conditional_get(etag):
+    """
+    Answers a GET with 304 Not Modified, without running the action, when the
+    client already holds the current version. `etag` is the name of a view
+    method, or a callable, taking (request, *args, **kwargs) and returning a
+    cheap version tag (typically derived from a generation counter).
+    """
+
+    def decorator(action):
+        @wraps(action)
+        def wrapper(view, request, *args, **kwargs):
+            etag_func = getattr(view, etag) if isinstance(etag, str) else etag
+            current = etag_func(request, *args, **kwargs)
+            if etag_matches(request, current):
+                return not_modified(current)
+            response = action(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                response["ETag"] = current
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def schedule_refresh(build, request, view_kwargs, cache_key, timeout, stale_timeout):
+    """
+    Enqueues one background recomputation of a stale entry. The refresh lock
+    keeps concurrent stale hits from enqueueing duplicate tasks.
+    """
+    refresh_lock = f"{cache_key}:refresh"
+    if not stale_timeout or not cache.add(refresh_lock, 1, SINGLE_FLIGHT_LOCK_TIMEOUT):
+        return
+
+    from config.tasks import refresh_cached_response
+
+    try:
+        refresh_cached_response.delay(
+            build,
+            request.build_absolute_uri(),
+            view_kwargs,
+            cache_key,
+            timeout,
+            stale_timeout,
+        )
+    except Exception:
+        # The broker being down must not fail a request that has data to serve
+        logger.exception("Could not enqueue a refresh for %s", cache_key)
+        cache.delete(refresh_lock)
+
+
+def get_request(url):
+    """
+    A bare GET request for an absolute URL, built from a WSGI environ like
+    the one the server hands Django, so data can be rebuilt outside of the
+    client request that asked for it.
+    """
+    parts = urlsplit(url)
+    return WSGIRequest(
+        {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": parts.path,
+            "QUERY_STRING": parts.query,
+            "HTTP_HOST": parts.netloc,
+            "SERVER_NAME": parts.hostname,
+            "SERVER_PORT": str(parts.port or (443 if parts.scheme == "https" else 80)),
+            "wsgi.url_scheme": parts.scheme,
+            "wsgi.input": BytesIO(),
+        }
+    )
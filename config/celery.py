@@ -15,6 +15,8 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
+# Project-wide tasks (e.g. background cache refreshes) live in config/tasks.py
+app.autodiscover_tasks(["config"])
 
 
 # Basic task failure monitoring: logs exceptions; extend to notify/email if needed
@@ -0,0 +1,216 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django_redis import get_redis_connection
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Per-host outbound metrics live in one Redis hash per host, so the numbers
+# of every web and Celery worker process add up in one place
+HTTP_METRICS_PREFIX = "http:metrics:"
+HTTP_METRICS_HOSTS_KEY = "http:metrics:hosts"
+
+# Keep-alive connections kept per host by the shared session
+HTTP_POOL_SIZE = 10
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of making a request while a host's circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After `threshold` consecutive failures the
+    circuit opens and calls fail fast for `cooldown` seconds; then a single
+    trial call is let through (half-open), which closes the circuit on
+    success or opens it again on failure.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if (
+                self.state == self.OPEN
+                and time.monotonic() - self.opened_at >= self.cooldown
+            ):
+                self.state = self.HALF_OPEN
+                return True
+            # Open, or half-open with the trial call still in flight
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        """
+        Counts a failure; returns True if it opened the circuit.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                opened = self.state != self.OPEN
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                return opened
+            return False
+
+
+class HttpClient:
+    """
+    Outbound HTTP client shared by the integrations (ImgBB uploads): one
+    pooled requests.Session, a (connect, read) timeout on every call, a
+    circuit breaker per host and per-host metrics in Redis.
+
+    5xx responses and exceptions (network errors or otherwise) count as
+    failures; the response of a request that got a 5xx is still returned, so
+    callers keep using raise_for_status().
+    """
+
+    def __init__(self, timeout=None, failure_threshold=None, cooldown=None):
+        self.timeout = timeout or (
+            settings.HTTP_CONNECT_TIMEOUT,
+            settings.HTTP_READ_TIMEOUT,
+        )
+        self.failure_threshold = failure_threshold or settings.HTTP_BREAKER_THRESHOLD
+        self.cooldown = settings.HTTP_BREAKER_COOLDOWN if cooldown is None else cooldown
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, host):
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.cooldown
+                )
+            return self.breakers[host]
+
+    def request(self, method, url, **kwargs):
+        host = urlsplit(url).netloc
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            record(host, state=breaker.state, short_circuited=1)
+            raise CircuitOpenError(f"Circuit open for {host}; not calling {url}.")
+
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except BaseException:
+            # Not only network errors: a half-open trial that ended any other
+            # way would leave the circuit rejecting every call to the host
+            self._failed(host, breaker, started, errors=1)
+            raise
+        if response.status_code >= 500:
+            self._failed(host, breaker, started, server_errors=1)
+        else:
+            breaker.record_success()
+            record(host, started=started, requests=1, state=breaker.state)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def _failed(self, host, breaker, started, **counts):
+        if breaker.record_failure():
+            logger.warning(
+                "Circuit for %s opened after %d failures; failing fast for %ss.",
+                host,
+                breaker.failures,
+                breaker.cooldown,
+            )
+        record(host, started=started, requests=1, state=breaker.state, **counts)
+
+
+def record(host, started=None, state=None, **counts):
+    """
+    Adds to a host's metrics hash: the given counters, the call's latency in
+    milliseconds when `started` is set, and the last seen circuit state.
+    Metrics are best effort and never fail the call they describe.
+    """
+    key = f"{HTTP_METRICS_PREFIX}{host}"
+    try:
+        with get_redis_connection("default").pipeline(transaction=False) as pipe:
+            pipe.sadd(HTTP_METRICS_HOSTS_KEY, host)
+            for name, value in counts.items():
+                pipe.hincrby(key, name, value)
+            if started is not None:
+                elapsed_ms = (time.monotonic() - started) * 1000
+                pipe.hincrbyfloat(key, "latency_ms_total", elapsed_ms)
+            if state is not None:
+                pipe.hset(key, "state", state)
+            pipe.execute()
+    except Exception as e:
+        logger.warning("Could not record HTTP metrics for %s: %s", host, e)
+
+
+def metrics():
+    """
+    {host: {"requests", "errors", "server_errors", "short_circuited",
+    "latency_ms_avg", "state"}} across all processes.
+    """
+    redis = get_redis_connection("default")
+    result = {}
+    for host in sorted(h.decode() for h in redis.smembers(HTTP_METRICS_HOSTS_KEY)):
+        raw = {
+            name.decode(): value.decode()
+            for name, value in redis.hgetall(f"{HTTP_METRICS_PREFIX}{host}").items()
+        }
+        requests_made = int(raw.get("requests", 0))
+        result[host] = {
+            "requests": requests_made,
+            "errors": int(raw.get("errors", 0)),
+            "server_errors": int(raw.get("server_errors", 0)),
+            "short_circuited": int(raw.get("short_circuited", 0)),
+            "latency_ms_avg": (
+                float(raw.get("latency_ms_total", 0)) / requests_made
+                if requests_made
+                else None
+            ),
+            "state": raw.get("state", CircuitBreaker.CLOSED),
+        }
+    return result
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def http_client():
+    """
+    The process-wide HttpClient, created on first use (after Celery forks
+    its workers, so no pooled connection is shared between processes).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,175 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BooleanField, F, Func, Q, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+def reverse_ordering(ordering):
+    return tuple(o[1:] if o.startswith("-") else "-" + o for o in ordering)
+
+
+class RowComparison(Func):
+    """
+    `(a, b, ...) < (x, y, ...)`: an SQL row-value comparison. PostgreSQL and
+    SQLite both compare row values lexicographically, and an index on
+    (a, b, ...) answers it with a single range scan.
+    """
+
+    output_field = BooleanField()
+
+    def __init__(self, lhs, operator, rhs):
+        self.operator = operator
+        self.width = len(lhs)
+        super().__init__(*lhs, *rhs)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        parts, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            parts.append(sql)
+            params.extend(expression_params)
+        lhs = ", ".join(parts[: self.width])
+        rhs = ", ".join(parts[self.width :])
+        return f"({lhs}) {self.operator} ({rhs})", params
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination used by every list endpoint.
+
+    The cursor holds the values of every ordering column of the last row
+    served, the primary key included, and the next page is fetched with
+    `WHERE (<key>, id) > (<key of last row>, <id of last row>) ORDER BY
+    <key>, id LIMIT n` instead of OFFSET. Page 1000 therefore costs the same
+    as page 1 as long as (key, id) is indexed, however many rows share a key.
+    Views pick their key with a `cursor_ordering` attribute; the default is
+    the primary key, newest first. Querysets that a search backend annotated
+    with `search_rank` are paged best match first. An `?ordering=` accepted
+    by the view's OrderingFilter takes precedence. The primary key is always
+    appended as a tie-breaker, so every row has a distinct position.
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = 100  # Hard upper limit, whatever the client asks for
+    ordering = "-id"
+    rank_annotation = "search_rank"
+
+    def get_ordering(self, request, queryset, view):
+        view_ordering = getattr(view, "cursor_ordering", None)
+        if self.rank_annotation in queryset.query.annotations:
+            self.ordering = ("-" + self.rank_annotation, "-id")
+        elif view_ordering:
+            self.ordering = view_ordering
+        ordering = super().get_ordering(request, queryset, view)
+        if not {"id", "-id", "pk", "-pk"}.intersection(ordering):
+            # Same direction as the leading key, so a (key, id) index serves it
+            tie_breaker = "-id" if ordering[0].startswith("-") else "id"
+            ordering = (*ordering, tie_breaker)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        CursorPagination.paginate_queryset, except that the position filter
+        covers the whole ordering rather than its first column. Positions are
+        unique, so the cursors built from them never carry an offset.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        ordering = reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = self.filter_after(queryset, ordering, current_position)
+
+        # One extra row tells whether there is a page following this one
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.page = list(results[: self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # The rows were fetched backwards; serve them in the normal order
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def filter_after(self, queryset, ordering, position):
+        """
+        Rows strictly after `position` in `ordering`. A single row-value
+        comparison when all columns run the same way (always the case for
+        the orderings above), the equivalent OR of prefixes otherwise.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        names = [o.lstrip("-") for o in ordering]
+        fields = [queryset.query.resolve_ref(name).output_field for name in names]
+        try:
+            values = [field.to_python(v) for field, v in zip(fields, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+        descending = {o.startswith("-") for o in ordering}
+        if len(descending) == 1:
+            return queryset.filter(
+                RowComparison(
+                    [F(name) for name in names],
+                    "<" if descending.pop() else ">",
+                    [Value(v, output_field=f) for v, f in zip(values, fields)],
+                )
+            )
+
+        condition = Q()
+        for i, order in enumerate(ordering):
+            lookup = "__lt" if order.startswith("-") else "__gt"
+            condition |= Q(
+                **dict(zip(names[:i], values[:i])), **{names[i] + lookup: values[i]}
+            )
+        return queryset.filter(condition)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [
+            instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            for name in (o.lstrip("-") for o in ordering)
+        ]
+        return json.dumps(values, cls=DjangoJSONEncoder)
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Third-party apps
     "rest_framework",
     "rest_framework_simplejwt",
@@ -143,11 +144,14 @@ AUTH_USER_MODEL = "users.User"
 # Django REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # JWTAuthentication, with the user resolved from the cache
+        "apps.users.authentication.CachedJWTAuthentication",
         # "rest_framework.authentication.BasicAuthentication",
         # 'rest_framework.authentication.SessionAuthentication',
     ),
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    "DEFAULT_PAGINATION_CLASS": "config.pagination.KeysetCursorPagination",
+    "PAGE_SIZE": 20,
 }
 
 SIMPLE_JWT = {
@@ -269,8 +273,16 @@ CELERY_BEAT_SCHEDULE = {
         "task": "apps.loans.tasks.calculate_and_notify_fines",
         "schedule": crontab(hour=8, minute=5),
     },
+    "send-daily-digests": {
+        "task": "apps.loans.tasks.send_daily_digests",
+        "schedule": crontab(hour=8, minute=15),
+    },
 }
 
+# Loan ids per shard when the daily circulation jobs (due date reminders,
+# fines) fan out over the Celery workers
+CIRCULATION_SHARD_SIZE = int(os.getenv("CIRCULATION_SHARD_SIZE", "5000"))
+
 # --- EMAIL CONFIGURATION ---
 # EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
@@ -280,11 +292,33 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("MAIL_USER")
 EMAIL_HOST_PASSWORD = os.getenv("MAIL_PASSWORD")
 
+# Bulk notification emails (see apps.users.tasks.send_bulk_email_task):
+# messages per Celery task, sharing one SMTP connection, and the maximum
+# send rate in messages per second (0 disables the cap)
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "100"))
+EMAIL_RATE_LIMIT = float(os.getenv("EMAIL_RATE_LIMIT", "10"))
+
+# Send one daily digest per user (loans due tomorrow and pending fines)
+# instead of a separate reminder or fine notice per loan (default: off)
+EMAIL_DIGEST_ENABLED = os.getenv("EMAIL_DIGEST_ENABLED", "false").lower() == "true"
+
 # Toggle email verification for user registration (default: on)
 EMAIL_VERIFICATION_ENABLED = (
     os.getenv("EMAIL_VERIFICATION_ENABLED", "true").lower() == "true"
 )
 
+# Mirror active book queues in Redis sorted sets (see apps.queues.index)
+# for O(log n) positions and join checks. Rebuilt by rebuild_queue_index.
+QUEUE_INDEX_ENABLED = os.getenv("QUEUE_INDEX_ENABLED", "false").lower() == "true"
+
+# Outbound HTTP (see config.http): connect/read timeouts in seconds, and
+# the consecutive failures after which a host's circuit opens, failing
+# calls fast for HTTP_BREAKER_COOLDOWN seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+HTTP_BREAKER_THRESHOLD = int(os.getenv("HTTP_BREAKER_THRESHOLD", "5"))
+HTTP_BREAKER_COOLDOWN = float(os.getenv("HTTP_BREAKER_COOLDOWN", "30"))
+
 # Frontend Configuration
 FRONTEND_BASE_URL = os.getenv(
     "FRONTEND_BASE_URL", "http://localhost:8000"
@@ -0,0 +1,24 @@
+from celery import shared_task
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.module_loading import import_string
+
+from .cache import get_request, make_entry
+
+
+@shared_task
+def refresh_cached_response(build, url, view_kwargs, cache_key, timeout, stale_timeout):
+    """
+    Recomputes a stale cached_response entry in the background, by calling
+    its `build` function for a GET on `url`.
+    """
+    try:
+        try:
+            data = import_string(build)(get_request(url), **view_kwargs)
+        except Http404:
+            cache.delete(cache_key)
+            return f"Dropped {cache_key} (not found)."
+        cache.set(cache_key, make_entry(data, timeout), timeout + stale_timeout)
+        return f"Refreshed {cache_key}."
+    finally:
+        cache.delete(f"{cache_key}:refresh")
@@ -1,11 +1,9 @@
 from datetime import timedelta
 
-from django.db.models import Count, Q
 from django.utils import timezone
 
 from apps.books.models import Book
 from apps.loans.models import Loan
-from apps.queues.models import BookQueue
 from apps.users.models import User
 
 
@@ -19,11 +17,7 @@ def get_dashboard_context():
     overdue_books = Loan.objects.filter(
         due_date__lt=timezone.now(), is_returned=False
     ).count()
-    books_with_queues = (
-        Book.objects.filter(queues__status=BookQueue.QueueStatus.ACTIVE)
-        .distinct()
-        .count()
-    )
+    books_with_queues = Book.objects.filter(active_queue_length__gt=0).count()
 
     # --- Widget Data ---
     recently_returned = Loan.objects.filter(is_returned=True).order_by("-return_date")[
@@ -32,15 +26,9 @@ def get_dashboard_context():
     most_overdue = Loan.objects.filter(
         is_returned=False, due_date__lt=timezone.now()
     ).order_by("due_date")[:5]
-    top_queued_books = (
-        Book.objects.annotate(
-            active_queue_count=Count(
-                "queues", filter=Q(queues__status=BookQueue.QueueStatus.ACTIVE)
-            )
-        )
-        .filter(active_queue_count__gt=0)
-        .order_by("-active_queue_count")[:5]
-    )
+    top_queued_books = Book.objects.filter(active_queue_length__gt=0).order_by(
+        "-active_queue_length"
+    )[:5]
 
     # --- Chart Data ---
     seven_days_ago = timezone.now() - timedelta(days=7)
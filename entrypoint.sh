@@ -37,6 +37,13 @@ fi
 echo "Checking for superuser..."
 python manage.py createsuperuser_from_env
 
+# Redis may have been flushed or replaced since the last deploy
+echo "Rebuilding the book suggest index..."
+python manage.py rebuild_suggest_index
+
+echo "Rebuilding the queue index..."
+python manage.py rebuild_queue_index
+
 # Start the application
 echo "Starting Gunicorn server..."
 exec gunicorn config.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file